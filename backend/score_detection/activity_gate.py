@@ -0,0 +1,99 @@
+# activity_gate.py
+
+import cv2
+import numpy as np
+
+from utils import get_time_string
+
+
+class ActivityGate:
+    """
+    Cheap motion check that decides which frames need ball / rim inference.
+
+    Consecutive frames are differenced inside the score region of the last known hoop,
+    a frame has motion if enough pixels of the region changed by more than pixel_delta.
+    After idle_frames frames without motion the gate drops to inferring only every
+    idle_stride-th frame, and goes back to full rate on the first frame with motion.
+    Every idle period is recorded so skipped ranges can be audited from the run report.
+    """
+    def __init__(self, pixel_delta, min_changed, idle_frames, idle_stride, sample_width=64):
+        self.pixel_delta = pixel_delta  # grey level difference for a pixel to count as changed
+        self.min_changed = min_changed  # fraction of changed pixels counted as motion
+        self.idle_frames = idle_frames
+        self.idle_stride = max(1, idle_stride)
+        self.sample_width = sample_width
+
+        self.prev_sample = None
+        self.still_frames = 0
+        self.skipped_frames = 0
+        self.skipped_ranges = []
+        self.current_range = None
+
+    def _sample(self, frame, region):
+        """Small greyscale copy of the region of the frame"""
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = region
+        x1, x2 = max(0, int(x1)), min(width, int(x2))
+        y1, y2 = max(0, int(y1)), min(height, int(y2))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+
+        crop = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        sample_height = max(1, int(self.sample_width * (y2 - y1) / (x2 - x1)))
+        return cv2.resize(crop, (self.sample_width, sample_height), interpolation=cv2.INTER_AREA)
+
+    def should_infer(self, frame_count, timestamp, frame, region):
+        """region is the score region (x1, y1, x2, y2) of the last known hoop, or None"""
+        # Nothing to gate on until the hoop has been found
+        if region is None:
+            self.prev_sample = None
+            self._wake()
+            return True
+
+        sample = self._sample(frame, region)
+        motion = True
+        if sample is not None and self.prev_sample is not None and sample.shape == self.prev_sample.shape:
+            changed = np.count_nonzero(cv2.absdiff(sample, self.prev_sample) > self.pixel_delta)
+            motion = changed > self.min_changed * sample.size
+        self.prev_sample = sample
+
+        if motion:
+            self._wake()
+            return True
+
+        self.still_frames += 1
+        if self.still_frames <= self.idle_frames:
+            return True
+
+        # Idle, keep hoop / ball positions warm at a low rate
+        if self.current_range is None:
+            self.current_range = {
+                'start_frame': frame_count,
+                'start_time': get_time_string(timestamp),
+                'skipped_frames': 0
+            }
+        self.current_range['end_frame'] = frame_count
+        self.current_range['end_time'] = get_time_string(timestamp)
+
+        if (self.still_frames - self.idle_frames) % self.idle_stride == 0:
+            return True
+
+        self.current_range['skipped_frames'] += 1
+        self.skipped_frames += 1
+        return False
+
+    def _wake(self):
+        self.still_frames = 0
+        if self.current_range is not None:
+            self.skipped_ranges.append(self.current_range)
+            self.current_range = None
+
+    def report(self):
+        if self.current_range is not None:
+            self.skipped_ranges.append(self.current_range)
+            self.current_range = None
+
+        return {
+            'skipped_frames': self.skipped_frames,
+            'skipped_ranges': self.skipped_ranges
+        }
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_socketio import SocketIO
 from shot_detector import ShotDetector
 from generate_pdf import generate_basketball_pdf
@@ -8,8 +8,17 @@ import yaml
 import os
 import time
 from match_handler import MatchHandler
+from model_registry import registry
+from job_scheduler import JobScheduler
+from checkpoint import CheckpointStore
+from highlight_export import HighlightExporter, filter_highlights
+from detection_cache import DetectionCache, DETECTION_SETTINGS
+from scoring import scoring_params
+from upload_session import UploadStore, UploadError, COMPLETE
+from metrics import metrics, JOBS, LIVE_RUNS
 import uuid
 import json
+import random
 
 from logger import (
     INFO,
@@ -37,6 +46,35 @@ CORS(app)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Bounded number of concurrently processed uploads, others wait in the queue
+scheduler = JobScheduler(env.get('max_concurrent_jobs', 1))
+
+# Unfinished runs and their progress, resumed when the server restarts
+checkpoints = CheckpointStore(env['checkpoint_path'])
+
+# Attempts of processed videos, a re-upload of the same video skips inference
+detection_cache = None
+if env.get('detection_cache', False):
+    detection_cache = DetectionCache(
+        env['detection_cache_path'],
+        [env['weights_path'], env['weights_path_shoot']],
+        {key: env.get(key) for key in DETECTION_SETTINGS},
+        scoring_params(env)
+    )
+
+# Resumable uploads, and runs waiting for them to be finalized: run_id -> (handler_args, priority)
+uploads = UploadStore(app.config['UPLOAD_FOLDER'], env['upload_session_path'])
+pending_runs = {}
+pending_lock = threading.Lock()
+# Runs that failed because the upload they followed stalled, restarted once it completes
+stalled_runs = set()
+
+# Start runs on the part of an upload that has arrived instead of waiting for finalize
+tail_follow = env.get('tail_follow_uploads', False)
+
+# Runs on live streams, started right away instead of queued: run_id -> MatchHandler
+live_runs = {}
+
 # Callback functions for MatchHandler
 def on_detection(run_id, start_time, end_time, success, team=None, video_id=1):
     '''
@@ -121,17 +159,91 @@ def on_complete(run_id, report, is_match):
     socketio.emit('processing_complete', data)
 
 
+def start_run(run_id, handler_args, priority=0):
+    """Create the MatchHandler for a run and queue it for processing"""
+    handler = MatchHandler(
+        **handler_args,
+        on_detection_callback=on_detection,
+        on_complete_callback=on_complete,
+        run_id=run_id,
+        checkpoints=checkpoints,
+        detection_cache=detection_cache,
+        uploads=uploads
+    )
+
+    def process():
+        try:
+            handler.process()
+        except TimeoutError:
+            # The upload the run followed stalled, it is restarted from its checkpoint
+            # once the upload completes
+            with pending_lock:
+                stalled_runs.add(run_id)
+            raise
+        except Exception:
+            # Anything else fails again when resumed, don't resume it on the next start
+            checkpoints.clear(run_id)
+            raise
+
+    scheduler.submit(run_id, process, priority)
+
+def start_waiting_runs(upload_id):
+    """Start the runs whose last unfinished upload was upload_id"""
+    with pending_lock:
+        waiting = uploads.waiting_runs()
+        session = uploads.get(upload_id)
+        for run_id in session['run_ids']:
+            if run_id in pending_runs and run_id not in waiting:
+                handler_args, priority = pending_runs.pop(run_id)
+                logger.log(INFO, f"Uploads of run {run_id} complete")
+                start_run(run_id, handler_args, priority)
+
+            # Runs that followed an upload fail when it stalls, they resume from their checkpoint
+            if tail_follow and run_id in stalled_runs:
+                stalled_runs.discard(run_id)
+                handler_args = dict(checkpoints.load_runs()).get(run_id)
+                if handler_args:
+                    logger.log(INFO, f"Restarting run {run_id} after its upload completed")
+                    start_run(run_id, handler_args)
+
+def resume_unfinished_runs():
+    """Queue runs interrupted by a restart, they continue from their last checkpoint"""
+    waiting = uploads.waiting_runs()
+    for run_id, handler_args in checkpoints.load_runs():
+        if run_id in waiting and not tail_follow:
+            logger.log(INFO, f"Run {run_id} is waiting for uploads {waiting[run_id]}")
+            pending_runs[run_id] = (handler_args, 0)
+            continue
+
+        videos = [handler_args['video1_path'], handler_args['video2_path'] if handler_args['is_match'] else None]
+        if not all(os.path.exists(video) for video in videos if video):
+            logger.log(INFO, f"Dropping unfinished run {run_id}, video not found")
+            checkpoints.clear(run_id)
+            continue
+
+        logger.log(INFO, f"Resuming unfinished run {run_id}")
+        start_run(run_id, handler_args)
+
 @app.route('/upload' , methods=['POST'])
 def upload_video():
     run_id = str(uuid.uuid4())
     
     logger.log(INFO, 'upload_video')
 
+    # Lower values are processed first, checked before any file is saved
+    try:
+        priority = int(request.form.get('priority', 0))
+    except ValueError:
+        return jsonify({'error': 'priority must be an integer'}), 400
+
     video1 = request.files.get('video1')
     video2 = request.files.get('video2')
     video1_name = request.form.get('video1FileName')
     video2_name = request.form.get('video2FileName')
 
+    # Videos sent through /uploads instead of in this request
+    upload_ids = (request.form.get('video1UploadId'), request.form.get('video2UploadId'))
+
     points1 = request.form.get('points1')
     points2 = request.form.get('points2')
 
@@ -161,32 +273,280 @@ def upload_video():
         if video2:
             video2.save(video2_path)
 
-     # Create MatchHandler
+    sessions = []
+    for upload_id in upload_ids:
+        session = uploads.get(upload_id) if upload_id else None
+        if upload_id and session is None:
+            return jsonify({'error': f'No upload found for upload_id {upload_id}'}), 404
+        sessions.append(session)
+
+    if sessions[0]:
+        video1_path = sessions[0]['path']
+    if sessions[1]:
+        video2_path = sessions[1]['path']
+
+    handler_args = {
+        "video1_path" : video1_path,
+        "video2_path" : video2_path,
+        "quarter_timestamps" : score_team_args["quarter_timestamps"],
+        "is_match" : score_team_args["is_match"],
+        "is_switched" : score_team_args["is_switched"],
+        "switch_time" : score_team_args["switch_time"],
+        "points1" : points1,
+        "points2" : points2,
+        "image_dimensions1" : image_dimensions1,
+        "image_dimensions2" : image_dimensions2,
+        "upload_ids" : list(upload_ids),
+        "profile" : request.form.get('profile') == 'true' or random.random() < env.get('profile_sample_rate', 0)
+    }
+
+    # Record the run so it can be resumed if the server restarts
+    checkpoints.save_run(run_id, handler_args)
+
+    # Runs referencing unfinished uploads start once those are finalized,
+    # or right away following the uploads as they arrive
+    with pending_lock:
+        unfinished = [uploads.attach_run(session['upload_id'], run_id) for session in sessions if session]
+        unfinished = [session['upload_id'] for session in unfinished if session['state'] != COMPLETE]
+        if tail_follow:
+            unfinished = []
+        if unfinished:
+            pending_runs[run_id] = (handler_args, priority)
+
+    if unfinished:
+        return jsonify({
+            'run_id' : run_id,
+            'message' : 'Processing starts when the uploads are finalized',
+            'status' : {'run_id': run_id, 'state': 'waiting_for_upload', 'uploads': unfinished}
+        })
+
+    start_run(run_id, handler_args, priority)
+
+    return jsonify({
+        'run_id' : run_id,
+        'message' : 'Processing queued successfully',
+        'status' : scheduler.status(run_id)
+    })
+
+@app.route('/live', methods=['POST'])
+def start_live():
+    """
+    Start processing live streams, the body is JSON with the fields of /upload except
+    the video files, and the sources as URLs (e.g. rtsp://) or pipes:
+    {
+        'source1' :             str,
+        'source2' :             str[Optional],  => if isMatch
+        'isMatch' :             bool,
+        'isSwitched' :          bool,
+        'switchTimestamp' :     str,
+        'quarterTimestamps' :   str,
+        'points1' / 'points2', 'imageDimensions1' / 'imageDimensions2',
+        'profile' :             bool[Optional]
+    }
+    Shots are emitted as shooting_detected while the streams run, and processing_complete
+    is emitted when they end.
+    """
+    run_id = str(uuid.uuid4())
+    data = request.json or {}
+
+    if not data.get('source1'):
+        return jsonify({'error': 'source1 is required'}), 400
+
     handler = MatchHandler(
-        video1_path=video1_path,
-        video2_path=video2_path,
-        quarter_timestamps=score_team_args["quarter_timestamps"],
-        is_match=score_team_args["is_match"],
-        is_switched=score_team_args["is_switched"],
-        switch_time=score_team_args["switch_time"],
-        points1=points1,
-        points2=points2,
-        image_dimensions1=image_dimensions1,
-        image_dimensions2=image_dimensions2,
+        data.get('source1'),
+        data.get('source2'),
+        data.get('quarterTimestamps', '00:00:00').split(','),
+        is_match=data.get('isMatch', False),
+        is_switched=data.get('isSwitched', False),
+        switch_time=data.get('switchTimestamp') or '99:99:99',
+        points1=data.get('points1'),
+        points2=data.get('points2'),
+        image_dimensions1=data.get('imageDimensions1'),
+        image_dimensions2=data.get('imageDimensions2'),
         on_detection_callback=on_detection,
         on_complete_callback=on_complete,
-        run_id=run_id
+        run_id=run_id,
+        live=True,
+        profile=data.get('profile', False) or random.random() < env.get('profile_sample_rate', 0)
     )
 
-    thread = threading.Thread(target=handler.start_processing)
-    thread.daemon = True
-    thread.start()
+    # Not queued behind uploads, a live stream can't wait
+    live_runs[run_id] = handler
+    handler.start_processing()
 
     return jsonify({
         'run_id' : run_id,
-        'message' : 'Processing started successfully'
+        'message' : 'Live processing started',
+        'status' : {'run_id': run_id, 'state': 'live'}
     })
-    
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """
+    Start a resumable upload, the body is JSON:
+    {
+        'filename' :    str,
+        'size' :        int,            => total bytes
+        'sha256' :      str[Optional],  => hex digest checked on finalize
+    }
+    """
+    data = request.json or {}
+    try:
+        session = uploads.create(data.get('filename'), data.get('size'), data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    return jsonify(session)
+
+@app.route('/uploads/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Write the raw request body at the byte offset given by the offset query parameter"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+
+    try:
+        # Streamed to the file as it arrives, nothing is spooled in memory or temp files
+        session = uploads.write_chunk(upload_id, offset, request.stream)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    return jsonify(session)
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Bytes received so far, a resumed upload continues from received"""
+    session = uploads.get(upload_id)
+
+    if session is None:
+        return jsonify({'error': f'No upload found for upload_id {upload_id}'}), 404
+
+    return jsonify(session)
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Verify the upload and start the runs that were waiting for it"""
+    try:
+        session, digest = uploads.finalize(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    # Spare the detection cache from hashing the video again
+    if detection_cache and digest:
+        detection_cache.remember_digest(session['path'], digest)
+
+    start_waiting_runs(upload_id)
+
+    return jsonify(session)
+
+@app.route('/status/<run_id>', methods=['GET'])
+def job_status(run_id):
+    """State of the processing job for a run: waiting_for_upload, queued, running, done, failed or live"""
+    if run_id in live_runs:
+        handler = live_runs[run_id]
+        done = handler.video_1_complete and handler.video_2_complete
+        return jsonify({'run_id': run_id, 'state': 'done' if done else 'live'})
+
+    with pending_lock:
+        if run_id in pending_runs:
+            return jsonify({'run_id': run_id, 'state': 'waiting_for_upload', 'uploads': uploads.waiting_runs().get(run_id, [])})
+
+    status = scheduler.status(run_id)
+
+    if status is None:
+        return jsonify({'error': f'No job found for run_id {run_id}'}), 404
+
+    return jsonify(status)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latencies, queue depths and job counts in the Prometheus text format"""
+    for state, count in scheduler.counts().items():
+        JOBS.set(count, state=state)
+    LIVE_RUNS.set(sum(1 for handler in list(live_runs.values())
+                      if not (handler.video_1_complete and handler.video_2_complete)))
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profile/<run_id>', methods=['GET'])
+def get_profile(run_id):
+    """Profile of a finished run that was profiled"""
+    profile_path = os.path.join(app.config['DATA_FOLDER'], f"{os.path.basename(run_id)}.profile.json")
+    if not os.path.exists(profile_path):
+        return jsonify({'error': f'No profile found for run_id {run_id}'}), 404
+
+    return send_file(os.path.abspath(profile_path), mimetype='application/json')
+
+@app.route('/highlights/<run_id>', methods=['GET'])
+def list_highlights(run_id):
+    """Highlights of a finished run, with the clip file of each if they were exported"""
+    stats_file_path = os.path.join(app.config['DATA_FOLDER'], f"{run_id}.json")
+
+    if not os.path.exists(stats_file_path):
+        return jsonify({"error": f"Data file for run_id {run_id} not found"}), 404
+
+    with open(stats_file_path, "r") as json_file:
+        report_data = json.load(json_file)
+
+    return jsonify({'run_id': run_id, 'highlights': report_data.get('highlights', [])})
+
+@app.route('/highlights/<run_id>/reel', methods=['GET'])
+def get_highlight_reel(run_id):
+    """
+    Single highlight reel of a finished run, optionally filtered with the query parameters
+    team ('A' or 'B'), quarter (index as in the results) and made ('true' or 'false')
+    """
+    stats_file_path = os.path.join(app.config['DATA_FOLDER'], f"{run_id}.json")
+
+    if not os.path.exists(stats_file_path):
+        return jsonify({"error": f"Data file for run_id {run_id} not found"}), 404
+
+    with open(stats_file_path, "r") as json_file:
+        report_data = json.load(json_file)
+
+    if 'video_paths' not in report_data:
+        return jsonify({"error": f"Source videos of run_id {run_id} are unknown"}), 404
+
+    team = request.args.get('team')
+    quarter = request.args.get('quarter', type=int)
+    made = request.args.get('made')
+    success = None if made is None else made == 'true'
+
+    highlights = filter_highlights(report_data.get('highlights', []), team, quarter, success)
+    if not highlights:
+        return jsonify({"error": "No highlights match the filters"}), 404
+
+    # Reels only depend on the filters, reuse one built before
+    clips_folder = os.path.join(app.config['DATA_FOLDER'], f"{os.path.basename(run_id)}_clips")
+    name = f"reel_{team or 'all'}_{'all' if quarter is None else quarter}_{made or 'all'}.mp4"
+    file_path = os.path.join(clips_folder, name)
+
+    if not os.path.exists(file_path):
+        exporter = HighlightExporter(
+            clips_folder,
+            env.get('highlight_max_lead_seconds', 2),
+            env.get('ffmpeg_path', 'ffmpeg'),
+            env.get('ffprobe_path', 'ffprobe')
+        )
+        video_paths = {int(video_id): path for video_id, path in report_data['video_paths'].items()}
+        frame_size = (env['output_width'], env['output_height'])
+        if exporter.export_reel(highlights, video_paths, name, frame_size) is None:
+            return jsonify({"error": f"Failed to build the highlight reel of run_id {run_id}"}), 500
+
+    return send_file(os.path.abspath(file_path), mimetype="video/mp4", conditional=True)
+
+@app.route('/highlights/<run_id>/<clip_name>', methods=['GET'])
+def get_highlight_clip(run_id, clip_name):
+    """Serve one exported highlight clip"""
+    # Sanitize to prevent directory traversal
+    clips_folder = os.path.join(app.config['DATA_FOLDER'], f"{os.path.basename(run_id)}_clips")
+    file_path = os.path.join(clips_folder, os.path.basename(clip_name))
+
+    if not os.path.exists(file_path):
+        return jsonify({"error": f"Clip {clip_name} not found for run_id {run_id}"}), 404
+
+    return send_file(os.path.abspath(file_path), mimetype="video/mp4", conditional=True)
+
 @app.route('/generate-report', methods=['POST'])
 def generate_report():
     logger.log(INFO, 'generate report')
@@ -243,5 +603,15 @@ def check_file():
 
 
 if __name__ == "__main__":
+    # debug=True starts the Werkzeug reloader, which runs this block in a parent process
+    # that only watches the sources and again in the child process that serves requests
+    serving = os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+    if serving:
+        # Load and warm up models before accepting uploads
+        warmup_height, warmup_width = env['warmup_shape']
+        registry.warmup([env['weights_path'], env['weights_path_shoot']], warmup_height, warmup_width, env.get('device', 0))
+
+        resume_unfinished_runs()
 
     socketio.run(app, debug=True, port=env['flask_port'])
\ No newline at end of file
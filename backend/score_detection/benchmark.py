@@ -0,0 +1,228 @@
+# benchmark.py
+#
+# Throughput benchmark of the detection pipeline, writes JSON so runs on different
+# commits can be compared. Run from this folder so config.yaml is found:
+#
+#   python benchmark.py --stub                        # synthetic clip, no weights needed
+#   python benchmark.py --clip uploads/game.mp4       # sample clip with the real models
+#   python benchmark.py --stub --stub-latency-ms 12 --output bench.json
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import shot_detector
+from model_registry import registry
+from shot_detector import ShotDetector, env
+
+# Colours (BGR) drawn by synthetic_clip, found again by the stub models
+BALL_COLOUR = 2     # red channel
+RIM_COLOUR = 0      # blue channel
+SHOOTER_COLOUR = 1  # green channel
+
+
+def synthetic_clip(path, seconds=20, fps=30, width=1280, height=720):
+    """
+    Write a clip of repeated shots: a red ball flying in an arc to a blue rim, through
+    it on even shots and beside it on odd ones, thrown by a green shooter.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    sx, sy = width / 320, height / 240
+    hx, hy, hw, hh = int(200 * sx), int(80 * sy), int(24 * sx), int(8 * sy)
+    shot_frames = int(fps * 100 / 30)
+
+    for i in range(int(seconds * fps)):
+        frame = np.full((height, width, 3), 60, np.uint8)
+        cv2.rectangle(frame, (hx - hw // 2, hy - hh // 2), (hx + hw // 2, hy + hh // 2), (255, 0, 0), -1)
+
+        t = (i % shot_frames) / shot_frames
+        shooter_x = int((30 + (i // shot_frames) * 10) * sx)
+        if 0.3 <= t < 0.4:
+            cv2.rectangle(frame, (shooter_x, int(150 * sy)), (shooter_x + int(20 * sx), int(200 * sy)), (0, 255, 0), -1)
+        if t < 0.5:
+            offset = 0 if (i // shot_frames) % 2 == 0 else 60
+            p = t / 0.5
+            x = 40 + (200 + offset - 40) * p
+            y = 200 - 300 * p + 180 * p ** 2
+            cv2.circle(frame, (int(x * sx), int(y * sy)), int(5 * sx), (0, 0, 255), -1)
+        writer.write(frame)
+
+    writer.release()
+
+
+class StubBox:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = np.array([xyxy], dtype=np.float32)
+        self.conf = conf
+        self.cls = cls
+
+
+class StubResult:
+    def __init__(self, boxes, img):
+        self.boxes = boxes
+        self.orig_img = img
+
+    def plot(self):
+        return self.orig_img
+
+
+def find_colour(img, channel, step=4):
+    """Bounding box of the saturated pixels of one colour channel, or None. Only every step-th pixel is checked"""
+    sample = img[::step, ::step]
+    mask = (sample[:, :, channel] > 200) & (sample.sum(axis=2, dtype=np.int32) < 400)
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return None
+    return [xs.min() * step, ys.min() * step, (xs.max() + 1) * step, (ys.max() + 1) * step]
+
+
+class StubModel:
+    """
+    Stands in for a YOLO model: returns the boxes scripted into synthetic clips by colour,
+    sleeping latency_ms per image to mimic the cost of real inference.
+    """
+    def __init__(self, shoot=False, latency_ms=0):
+        self.shoot = shoot
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()  # one stub serves the whole model pool
+        self.calls = 0
+        self.images = 0
+
+    def detect(self, img):
+        boxes = []
+        if self.shoot:
+            classes = env['classes_shoot']
+            shooter = find_colour(img, SHOOTER_COLOUR)
+            if shooter:
+                x1, y1, x2, y2 = shooter
+                boxes.append(StubBox(shooter, 0.9, classes.index('shoot')))
+                boxes.append(StubBox([x1 - 2, y1 - 2, x2 + 2, y2 + 2], 0.8, classes.index('person')))
+        else:
+            classes = env['classes']
+            ball = find_colour(img, BALL_COLOUR)
+            if ball:
+                boxes.append(StubBox(ball, 0.9, classes.index('ball')))
+            rim = find_colour(img, RIM_COLOUR)
+            if rim:
+                boxes.append(StubBox(rim, 0.95, classes.index('rim')))
+        return boxes
+
+    def __call__(self, source, stream=False, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        with self.lock:
+            self.calls += 1
+            self.images += len(images)
+        if self.latency:
+            time.sleep(self.latency * len(images))
+        results = [StubResult(self.detect(img), img) for img in images]
+        return iter(results) if stream else results
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_clip(clip_path):
+    """Run one clip through ShotDetector, returns its benchmark entry"""
+    reports = []
+    events = []
+
+    def on_detect(timestamp, success, video_id, shot_location):
+        events.append((timestamp, success))
+
+    start = time.perf_counter()
+    detector = ShotDetector(clip_path, on_detect, reports.append, False, video_id=0)
+    wall = time.perf_counter() - start
+
+    report = reports[0] if reports else {}
+    frames = detector.processed_frames
+    return {
+        'clip': clip_path,
+        'resolution': [int(detector.width), int(detector.height)],
+        'frames': frames,
+        'wall_seconds': round(wall, 3),
+        'fps': round(frames / wall, 2) if wall > 0 else 0,
+        'attempts': len(events),
+        'makes': sum(1 for _, success in events if success),
+        'stages': report.get('stage_timings', {}),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the throughput of the detection pipeline")
+    parser.add_argument('--clip', action='append', default=[], help="sample clip to run, can be repeated; a synthetic clip is used if none is given")
+    parser.add_argument('--seconds', type=float, default=20, help="length of the synthetic clip")
+    parser.add_argument('--fps', type=int, default=30, help="frame rate of the synthetic clip")
+    parser.add_argument('--resolution', default='1280x720', help="WIDTHxHEIGHT of the synthetic clip")
+    parser.add_argument('--stub', action='store_true', help="replace both models with stubs returning the scripted boxes")
+    parser.add_argument('--stub-latency-ms', type=float, default=0, help="time each stub inference takes per image")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per clip")
+    parser.add_argument('--output', default='benchmark.json', help="file the JSON results are written to")
+    args = parser.parse_args()
+
+    # Keep file output out of the measurement
+    shot_detector.env['save_video'] = False
+    shot_detector.env['screenshot'] = False
+
+    stubs = {}
+    if args.stub:
+        stubs = {
+            'main': StubModel(latency_ms=args.stub_latency_ms),
+            'shoot': StubModel(shoot=True, latency_ms=args.stub_latency_ms)
+        }
+        registry.register(env['weights_path'], lambda _: stubs['main'])
+        registry.register(env['weights_path_shoot'], lambda _: stubs['shoot'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = args.clip
+        if not clips:
+            width, height = (int(v) for v in args.resolution.lower().split('x'))
+            clip_path = os.path.join(tmp, f"synthetic_{width}x{height}.mp4")
+            synthetic_clip(clip_path, args.seconds, args.fps, width, height)
+            clips = [clip_path]
+
+        runs = [run_clip(clip) for clip in clips for _ in range(args.repeat)]
+
+    results = {
+        'commit': git_commit(),
+        'stub': args.stub,
+        'stub_latency_ms': args.stub_latency_ms if args.stub else None,
+        'config': {key: env.get(key) for key in [
+            'inference_batch_size', 'pipeline_queue_size', 'cooldown_inference_stride',
+            'activity_gate', 'hoop_roi', 'shoot_search_stride', 'model_pool_size'
+        ]},
+        'runs': runs,
+        'peak_rss_mb': peak_rss_mb()
+    }
+    if stubs:
+        results['stub_inferences'] = {name: {'calls': stub.calls, 'images': stub.images} for name, stub in stubs.items()}
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for run in runs:
+        print(f"{run['clip']}: {run['frames']} frames in {run['wall_seconds']}s, {run['fps']} fps, peak RSS {run['peak_rss_mb']} MB")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# checkpoint.py
+
+import json
+import os
+import threading
+
+
+class VideoCheckpoint:
+    """Checkpoint handle for one video of a run, passed to ShotDetector"""
+    def __init__(self, store, run_id, video_id):
+        self.store = store
+        self.run_id = run_id
+        self.video_id = video_id
+
+    def save(self, state):
+        self.store.save(self.run_id, self.video_id, state)
+
+    def load(self):
+        return self.store.load(self.run_id, self.video_id)
+
+
+class CheckpointStore:
+    """
+    Persists unfinished runs so processing can resume after a server restart.
+
+    Each run has a manifest with the arguments needed to recreate its MatchHandler,
+    and each of its videos has the latest ShotDetector checkpoint. Files are written
+    atomically and removed once the run completes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _run_file(self, run_id):
+        return os.path.join(self.path, f"{run_id}.run.json")
+
+    def _video_file(self, run_id, video_id):
+        return os.path.join(self.path, f"{run_id}.video{video_id}.json")
+
+    def _write(self, file_path, data):
+        tmp_path = file_path + ".tmp"
+        with self.lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, default=float)
+            os.replace(tmp_path, file_path)
+
+    def _read(self, file_path):
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    def save_run(self, run_id, args):
+        self._write(self._run_file(run_id), {'run_id': run_id, 'args': args})
+
+    def load_runs(self):
+        """List of (run_id, args) for every unfinished run"""
+        runs = []
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".run.json"):
+                data = self._read(os.path.join(self.path, name))
+                if data:
+                    runs.append((data['run_id'], data['args']))
+        return runs
+
+    def for_video(self, run_id, video_id):
+        return VideoCheckpoint(self, run_id, video_id)
+
+    def save(self, run_id, video_id, state):
+        self._write(self._video_file(run_id, video_id), state)
+
+    def load(self, run_id, video_id):
+        return self._read(self._video_file(run_id, video_id))
+
+    def clear(self, run_id):
+        """Remove the manifest and checkpoints of a finished run"""
+        with self.lock:
+            for name in os.listdir(self.path):
+                if name.startswith(f"{run_id}."):
+                    os.remove(os.path.join(self.path, name))
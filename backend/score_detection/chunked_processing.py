@@ -0,0 +1,139 @@
+# chunked_processing.py
+
+import multiprocessing
+import os
+import cv2
+
+from shot_detector import ShotDetector, env
+from model_registry import registry
+from scoring import scoring_params
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+
+def plan_chunks(total_frames, frame_rate, num_chunks, overlap_seconds):
+    """
+    Split a video into num_chunks consecutive time chunks.
+    Each chunk starts overlap_seconds before the part it owns, so ball / rim tracking
+    is warmed up by the time it reaches its own frames. The last chunk has no end_frame
+    and reads to the end of the video, container frame counts can be too low (variable
+    frame rate, a file still being written).
+    """
+    num_chunks = max(1, min(num_chunks, total_frames))
+    overlap_frames = int(overlap_seconds * frame_rate)
+    chunk_frames = total_frames // num_chunks
+
+    chunks = []
+    for i in range(num_chunks):
+        core_start = i * chunk_frames
+        end = None if i == num_chunks - 1 else (i + 1) * chunk_frames
+        chunks.append({
+            'index': i,
+            'start_frame': max(0, core_start - overlap_frames),
+            'core_start_frame': core_start,
+            'core_start_time': core_start / frame_rate * 1000,
+            'end_frame': end
+        })
+    return chunks
+
+
+def _process_chunk(video_path, video_id, start_frame, end_frame, num_threads):
+    """Runs in a worker process, returns the attempts and run report of one chunk"""
+    events = []
+    reports = []
+
+    # Chunks share the machine, one model per weights file and an even share of the cores each
+    registry.pool_size = 1
+    import torch  # installed with ultralytics
+    torch.set_num_threads(num_threads)
+
+    ShotDetector(
+        video_path,
+        lambda *event: events.append(event),
+        lambda report=None: reports.append(report),
+        show_vid=False,
+        video_id=video_id,
+        start_frame=start_frame,
+        end_frame=end_frame
+    )
+    return events, reports[0] if reports else None
+
+
+def merge_chunk_events(chunks, chunk_events, miss_cooldown, made_cooldown):
+    """
+    Merge the attempts of all chunks into a single stream ordered by timestamp.
+
+    Every chunk only contributes the attempts in the frames it owns, the previous chunk
+    processed all frames of its warm-up overlap. An attempt a chunk finds within the
+    cooldown (in ms) of the last attempt before its frames is dropped as well, a single
+    detector would not have registered it.
+    """
+    merged = []
+    for chunk, events in zip(chunks, chunk_events):
+        own = [event for event in events if event[0] >= chunk['core_start_time']]
+        if merged:
+            timestamp, scored = merged[-1][:2]
+            cooldown_end = timestamp + (made_cooldown if scored else miss_cooldown)
+            own = [event for event in own if event[0] >= cooldown_end]
+        merged.extend(sorted(own, key=lambda event: event[0]))
+
+    return merged
+
+
+def merge_chunk_reports(reports):
+    """Totals over the run reports of all chunks, keeping each chunk's report"""
+    merged = {'chunks': reports}
+    for report in reports:
+        for key, value in (report or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def process_video_chunked(video_path, video_id, num_chunks, overlap_seconds):
+    """
+    Process one video with an independent ShotDetector per time chunk, each in its own
+    process. Returns (events, report) where events are the de-duplicated on_detect
+    arguments in timestamp order, as a single detector would have produced them, or
+    None if the video can't be split and has to be processed by a single detector.
+    """
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_rate = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    # Streamed containers may not report a frame count, there is nothing to split on then
+    if total_frames <= 0 or frame_rate <= 0:
+        logger.log(INFO, f"Frame count of {video_path} unknown, not splitting it into chunks")
+        return None
+
+    chunks = plan_chunks(total_frames, frame_rate, num_chunks, overlap_seconds)
+    num_threads = max(1, (os.cpu_count() or 1) // len(chunks))
+    logger.log(INFO, f"Processing {video_path} in {len(chunks)} chunks of {num_threads} threads: {[(c['start_frame'], c['end_frame']) for c in chunks]}")
+
+    # Spawn fresh processes, forking a process with running threads and loaded models is unsafe
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=len(chunks)) as pool:
+        results = pool.starmap(
+            _process_chunk,
+            [(video_path, video_id, chunk['start_frame'], chunk['end_frame'], num_threads) for chunk in chunks]
+        )
+
+    chunk_events = [events for events, _ in results]
+    params = scoring_params(env)
+    events = merge_chunk_events(chunks, chunk_events, params['miss_cooldown_seconds'] * 1000, params['made_cooldown_seconds'] * 1000)
+    report = merge_chunk_reports([report for _, report in results])
+
+    # Chunk totals count the attempts found in both sides of an overlap
+    report['makes'] = sum(1 for event in events if event[1])
+    report['attempts'] = len(events)
+
+    logger.log(INFO, f"Merged {sum(len(e) for e in chunk_events)} chunk attempts into {len(events)}")
+    return events, report
@@ -0,0 +1,227 @@
+# detection_cache.py
+
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+MAIN_MODEL = 0
+SHOOT_MODEL = 1
+
+# Settings that change which detections the models return, part of the cache key. The
+# scoring parameters are not, cached detections are replayed with the current ones
+DETECTION_SETTINGS = [
+    'classes', 'classes_shoot', 'iou_threshold',
+    'cooldown_inference_stride', 'cooldown_resume_seconds',
+    'hoop_roi', 'hoop_roi_lock_frames', 'hoop_roi_max_jitter', 'hoop_roi_margin', 'hoop_roi_refresh_interval',
+    'activity_gate', 'activity_gate_pixel_delta', 'activity_gate_min_changed',
+    'activity_gate_idle_seconds', 'activity_gate_idle_stride',
+    'shoot_search_stride', 'shoot_search_max_inferences',
+    'parallel_chunks', 'chunk_overlap_seconds', 'main_inference_stride'
+]
+
+# Rescored attempts take the shot location of a cached attempt at most this close, in ms
+LOCATION_MATCH_MS = 1000
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of the file contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _Columns:
+    """Growable NumPy arrays of one row type, capacity doubles when full"""
+    def __init__(self, layout, capacity=1024):
+        self.layout = layout  # name -> (dtype, shape of one row)
+        self.size = 0
+        self.arrays = {name: np.empty((capacity, *shape), dtype=dtype) for name, (dtype, shape) in layout.items()}
+
+    def append(self, *values):
+        if self.size == len(next(iter(self.arrays.values()))):
+            for name, array in self.arrays.items():
+                grown = np.empty((2 * len(array), *array.shape[1:]), dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+
+        for array, value in zip(self.arrays.values(), values):
+            array[self.size] = value
+        self.size += 1
+
+    def to_arrays(self):
+        return {name: array[:self.size].copy() for name, array in self.arrays.items()}
+
+
+class DetectionLog:
+    """
+    Every box the models returned during a run, in full frame pixels and before any
+    confidence threshold, plus the timestamp of every processed frame. replay.py runs
+    the scoring state machine on saved logs.
+
+    Rows are written straight into arrays with the layout of the saved .npz.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boxes = _Columns({
+            'model': (np.uint8, ()),
+            'frame': (np.int64, ()),
+            'cls': (np.uint8, ()),
+            'conf': (np.float32, ()),
+            'xyxy': (np.int32, (4,))
+        })
+        self.frames = _Columns({
+            'frame_count': (np.int64, ()),
+            'timestamp': (np.float64, ()),
+            'inferred': (bool, ())
+        })
+        self.video = {}  # frame_rate, width, height and classes of the main model, scoring parameters
+
+    def set_video(self, frame_rate, width, height, classes, scoring=None):
+        self.video = {'frame_rate': frame_rate, 'width': width, 'height': height, 'classes': list(classes)}
+        if scoring is not None:
+            # Replays run with the scoring of the recorded run unless told otherwise
+            self.video['scoring'] = json.dumps(scoring, sort_keys=True)
+
+    def add_frame(self, frame_count, timestamp, inferred):
+        with self.lock:
+            self.frames.append(frame_count, timestamp, inferred)
+
+    def add_box(self, model, frame_count, cls, conf, box):
+        with self.lock:
+            self.boxes.append(model, frame_count, cls, conf, box)
+
+    def to_arrays(self):
+        with self.lock:
+            return {
+                **self.boxes.to_arrays(),
+                **self.frames.to_arrays(),
+                **{key: np.array(value) for key, value in self.video.items()}
+            }
+
+    def save(self, path):
+        np.savez_compressed(path, **self.to_arrays())
+
+
+class DetectionCache:
+    """
+    Detector output keyed by a content hash of the video, the model weights and the
+    detection settings, so a video that is uploaded again skips inference.
+
+    Every entry is a directory with events.json (the attempts passed to on_detect, the
+    run report and the scoring parameters of the run) and, when available, detections.npz
+    from a DetectionLog. If the scoring parameters changed since, the saved detections are
+    replayed with the current ones. Frames the first run skipped during attempt cooldowns
+    or while the activity gate was idle stay skipped in the replay.
+    """
+    def __init__(self, path, weights_paths, settings, scoring):
+        self.path = path
+        self.weights_paths = weights_paths
+        self.settings = settings
+        # Compared with the scoring of cached entries as read back from JSON
+        self.scoring = json.loads(json.dumps(scoring))
+        self.digests = {}  # (path, size, mtime) -> sha256, files are only hashed once
+        self.lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _digest(self, path):
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self.lock:
+            if file_key in self.digests:
+                return self.digests[file_key]
+
+        digest = file_digest(path)
+        with self.lock:
+            self.digests[file_key] = digest
+        return digest
+
+    def remember_digest(self, path, digest):
+        """Use a sha256 already computed for path, e.g. while verifying an upload"""
+        stat = os.stat(path)
+        with self.lock:
+            self.digests[(os.path.abspath(path), stat.st_size, stat.st_mtime)] = digest
+
+    def key(self, video_path):
+        digest = hashlib.sha256(self._digest(video_path).encode())
+        for weights_path in self.weights_paths:
+            digest.update(self._digest(weights_path).encode())
+        digest.update(json.dumps(self.settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def load(self, key):
+        """(events, report) of a cached run, or None"""
+        events_path = os.path.join(self._entry(key), 'events.json')
+        if not os.path.exists(events_path):
+            return None
+
+        with open(events_path, 'r') as f:
+            data = json.load(f)
+
+        events = [
+            (timestamp, success, video_id, tuple(shot_location) if shot_location else None)
+            for timestamp, success, video_id, shot_location in data['events']
+        ]
+        if data.get('scoring') == self.scoring:
+            return events, data['report']
+        return self._rescore(key, events, data['report'])
+
+    def load_detections(self, key):
+        """Arrays saved from the DetectionLog of a cached run, or None"""
+        detections_path = os.path.join(self._entry(key), 'detections.npz')
+        if not os.path.exists(detections_path):
+            return None
+        return dict(np.load(detections_path))
+
+    def _rescore(self, key, cached_events, report):
+        """(events, report) of the saved detections replayed with the current scoring, or None"""
+        detections = self.load_detections(key)
+        if detections is None or 'frame_rate' not in detections:
+            return None
+
+        # replay.py imports this module
+        from replay import Replay
+        machine = Replay(detections).run(self.scoring)
+
+        # Attempts are only localized when the models run, reuse the location of the
+        # cached attempt at the same time if there is one
+        events = []
+        video_id = cached_events[0][2] if cached_events else None
+        for timestamp, scored in machine.events:
+            nearest = min(cached_events, key=lambda event: abs(event[0] - timestamp), default=None)
+            shot_location = nearest[3] if nearest and abs(nearest[0] - timestamp) <= LOCATION_MATCH_MS else None
+            events.append((timestamp, scored, video_id, shot_location))
+
+        logger.log(INFO, f"Rescored {key}: {machine.makes} / {machine.attempts}, was {report['makes']} / {report['attempts']}")
+        return events, {**report, 'makes': machine.makes, 'attempts': machine.attempts, 'rescored': True}
+
+    def save(self, key, events, report, detection_log=None):
+        entry = self._entry(key)
+        os.makedirs(entry, exist_ok=True)
+
+        if detection_log is not None:
+            detection_log.save(os.path.join(entry, 'detections.npz'))
+
+        # events.json marks the entry as complete, write it last and atomically
+        events_path = os.path.join(entry, 'events.json')
+        with open(events_path + '.tmp', 'w') as f:
+            json.dump({'events': events, 'report': report, 'scoring': self.scoring}, f, default=float)
+        os.replace(events_path + '.tmp', events_path)
+
+        logger.log(INFO, f"Cached {len(events)} attempts under {key}")
@@ -0,0 +1,121 @@
+# frame_buffer.py
+
+import threading
+import numpy as np
+
+
+class FrameSnapshot:
+    """
+    Handle to the frames held by a FrameRingBuffer at the time of the snapshot.
+
+    Frames are read from the ring buffer storage while they are still there. Before the
+    buffer overwrites a frame the snapshot still refers to, that one frame is copied
+    out (see FrameRingBuffer.push), so a snapshot stays valid until it is released no
+    matter how far behind its reader is, and each push copies at most one frame per
+    pending snapshot.
+
+    Iterating yields (det_frame, frame_count, timestamp, full_frame) tuples, full_frame
+    is None if the buffer does not keep full resolution frames.
+    """
+    def __init__(self, buffer, start, end):
+        self.buffer = buffer
+        self.start = start  # first sequence number, inclusive
+        self.end = end      # last sequence number, exclusive
+
+        slots = self._slots()
+        self.frame_counts = buffer.frame_counts[slots]
+        self.timestamps = buffer.timestamps[slots]
+
+        # Own copies of the frames the buffer has overwritten since, by sequence number
+        self.copies = {}
+
+    def _slots(self):
+        return np.arange(self.start, self.end) % self.buffer.capacity
+
+    def _keep(self, seq):
+        """Copy frame seq out of the ring buffer before it is overwritten, must be called with the buffer lock held"""
+        slot = seq % self.buffer.capacity
+        full_frame = self.buffer.full_frames[slot].copy() if self.buffer.full_frames is not None else None
+        self.copies[seq] = (self.buffer.frames[slot].copy(), full_frame)
+
+        # Nothing left to read from the buffer
+        if seq == self.end - 1:
+            self.buffer.snapshots.discard(self)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("snapshot index out of range")
+
+        seq = self.start + i
+        with self.buffer.lock:
+            if seq in self.copies:
+                det_frame, full_frame = self.copies[seq]
+            else:
+                # Copy, the slot may be reused once this snapshot is released
+                slot = seq % self.buffer.capacity
+                det_frame = self.buffer.frames[slot].copy()
+                full_frame = self.buffer.full_frames[slot].copy() if self.buffer.full_frames is not None else None
+
+        return det_frame, int(self.frame_counts[i]), float(self.timestamps[i]), full_frame
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def release(self):
+        """Stop tracking this snapshot, frames read from it afterwards are undefined"""
+        with self.buffer.lock:
+            self.buffer.snapshots.discard(self)
+            self.copies = {}
+
+
+class FrameRingBuffer:
+    """
+    Fixed capacity history of the most recent inference frames.
+
+    Frames are stored in preallocated, contiguous arrays so pushing a frame does not
+    allocate. Full resolution frames are only kept if full_frame_shape is given.
+    """
+    def __init__(self, capacity, frame_shape, full_frame_shape=None):
+        self.capacity = max(1, int(capacity))
+        self.frames = np.empty((self.capacity, *frame_shape), dtype=np.uint8)
+        self.full_frames = np.empty((self.capacity, *full_frame_shape), dtype=np.uint8) if full_frame_shape else None
+        self.frame_counts = np.zeros(self.capacity, dtype=np.int64)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+
+        self.next_seq = 0       # sequence number of the next pushed frame
+        self.snapshots = set()  # snapshots still reading from the buffer storage
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.next_seq, self.capacity)
+
+    def push(self, det_frame, frame_count, timestamp, full_frame=None):
+        with self.lock:
+            # Snapshots that still need the frame about to be overwritten keep a copy of it
+            overwritten = self.next_seq - self.capacity
+            if overwritten >= 0:
+                for snapshot in list(self.snapshots):
+                    if snapshot.start <= overwritten < snapshot.end:
+                        snapshot._keep(overwritten)
+
+            slot = self.next_seq % self.capacity
+            self.frames[slot] = det_frame
+            if self.full_frames is not None and full_frame is not None:
+                self.full_frames[slot] = full_frame
+            self.frame_counts[slot] = frame_count
+            self.timestamps[slot] = timestamp
+
+            self.next_seq += 1
+
+    def snapshot(self):
+        """Cheap handle to the frames currently in the buffer, release() when done"""
+        with self.lock:
+            snapshot = FrameSnapshot(self, max(0, self.next_seq - self.capacity), self.next_seq)
+            self.snapshots.add(snapshot)
+        return snapshot
@@ -0,0 +1,197 @@
+# highlight_export.py
+
+import bisect
+import os
+import subprocess
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+
+def filter_highlights(highlights, team=None, quarter=None, success=None):
+    """Highlights matching every filter that is not None, quarter is the index used in the results"""
+    return [
+        highlight for highlight in highlights
+        if (team is None or highlight['team'] == team)
+        and (quarter is None or highlight['quarter'] == quarter)
+        and (success is None or highlight['success'] == success)
+    ]
+
+
+def merge_windows(windows):
+    """Merge overlapping (video_id, start, end) windows of the same video, in time order"""
+    merged = []
+    last = {}  # video_id -> index in merged of its latest window
+    for video_id, start, end in sorted(windows, key=lambda window: (window[1], window[0])):
+        i = last.get(video_id)
+        if i is not None and start <= merged[i][2]:
+            merged[i] = (video_id, merged[i][1], max(end, merged[i][2]))
+            continue
+        last[video_id] = len(merged)
+        merged.append((video_id, start, end))
+    return merged
+
+
+class HighlightExporter:
+    """
+    Cuts highlight clips out of the source videos with ffmpeg.
+
+    A clip is stream copied starting at the last keyframe before its start, so exporting
+    runs at about I/O speed and the clip may begin slightly early. It is only re-encoded
+    when that keyframe is more than max_lead seconds before the start, or the keyframes
+    of the video can't be read.
+    """
+    def __init__(self, output_path, max_lead, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+        self.output_path = output_path
+        self.max_lead = max_lead
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.keyframes = {}  # video path -> sorted keyframe times in seconds
+
+    def probe_keyframes(self, video_path):
+        """Keyframe times of the first video stream, read from packet flags without decoding"""
+        if video_path in self.keyframes:
+            return self.keyframes[video_path]
+
+        command = [
+            self.ffprobe, '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+        ]
+        keyframes = []
+        try:
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            for line in output.splitlines():
+                pts_time, _, flags = line.partition(',')
+                if 'K' in flags and pts_time not in ('', 'N/A'):
+                    keyframes.append(float(pts_time))
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.log(INFO, f"Could not read keyframes of {video_path}: {str(e)}")
+
+        keyframes.sort()
+        self.keyframes[video_path] = keyframes
+        return keyframes
+
+    def _keyframe_before(self, video_path, time):
+        keyframes = self.probe_keyframes(video_path)
+        i = bisect.bisect_right(keyframes, time)
+        return keyframes[i - 1] if i > 0 else None
+
+    def export(self, video_path, start, end, name):
+        """
+        Write the clip [start, end] (seconds) of video_path to output_path/name.
+        Returns (clip_start, mode) where mode is 'copy' or 'reencode', None if ffmpeg failed.
+        """
+        os.makedirs(self.output_path, exist_ok=True)
+        clip_path = os.path.join(self.output_path, name)
+
+        start = max(0, start)
+        keyframe = self._keyframe_before(video_path, start)
+
+        if keyframe is not None and start - keyframe <= self.max_lead:
+            mode = 'copy'
+            clip_start = keyframe
+            codec_args = ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+        else:
+            mode = 'reencode'
+            clip_start = start
+            codec_args = ['-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac']
+
+        # Seeking before the input jumps straight to the keyframe instead of decoding up to it
+        command = [
+            self.ffmpeg, '-v', 'error', '-y',
+            '-ss', f"{clip_start:.3f}", '-i', video_path,
+            '-t', f"{end - clip_start:.3f}",
+            *codec_args,
+            clip_path
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            logger.log(INFO, f"Failed to export {clip_path}: {result.stderr.strip()}")
+            return None
+
+        return clip_start, mode
+
+    def export_reel(self, highlights, video_paths, name, frame_size):
+        """
+        Concatenate the highlights into a single reel at output_path/name, in game time order.
+
+        Windows are snapped back to keyframes and overlapping ones merged, then ffmpeg's
+        concat demuxer cuts every segment in one run that seeks forward through each source,
+        so only the byte ranges of the reel are read. The reel is stream copied when it comes
+        from one video, segments from both videos are re-encoded to frame_size (width, height)
+        since the cameras can use different codec settings.
+        Returns the number of segments, None if ffmpeg failed.
+        """
+        windows = []
+        for highlight in highlights:
+            video_path = video_paths[highlight['video_id']]
+            start = max(0, highlight['start'])
+            keyframe = self._keyframe_before(video_path, start)
+            windows.append((highlight['video_id'], start if keyframe is None else keyframe, highlight['end']))
+
+        segments = merge_windows(windows)
+        if not segments:
+            return 0
+
+        os.makedirs(self.output_path, exist_ok=True)
+        reel_path = os.path.join(self.output_path, name)
+        list_path = reel_path + '.ffconcat'
+
+        with open(list_path, 'w') as f:
+            f.write("ffconcat version 1.0\n")
+            for video_id, start, end in segments:
+                source = os.path.abspath(video_paths[video_id]).replace("'", "'\\''")
+                f.write(f"file '{source}'\ninpoint {start:.3f}\noutpoint {end:.3f}\n")
+
+        single_source = len({video_id for video_id, _, _ in segments}) == 1
+        if single_source and all(self.probe_keyframes(video_paths[video_id]) for video_id, _, _ in segments):
+            codec_args = ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+        else:
+            width, height = frame_size
+            codec_args = [
+                '-vf', f"scale={width}:{height},setsar=1",
+                '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac'
+            ]
+
+        command = [
+            self.ffmpeg, '-v', 'error', '-y',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            *codec_args,
+            reel_path
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        os.remove(list_path)
+        if result.returncode != 0:
+            logger.log(INFO, f"Failed to export {reel_path}: {result.stderr.strip()}")
+            return None
+
+        logger.log(INFO, f"Exported reel {reel_path} from {len(highlights)} highlights in {len(segments)} segments")
+        return len(segments)
+
+    def export_all(self, highlights, video_paths):
+        """
+        Export a clip for every highlight, highlights are dicts with video_id, start and end
+        in seconds. Adds the clip file name, its actual start and the export mode to each.
+        """
+        for i, highlight in enumerate(highlights):
+            name = f"{i:03d}_video{highlight['video_id']}.mp4"
+            exported = self.export(video_paths[highlight['video_id']], highlight['start'], highlight['end'], name)
+
+            if exported is None:
+                highlight['clip'] = None
+                continue
+
+            clip_start, mode = exported
+            highlight['clip'] = name
+            highlight['clip_start'] = clip_start
+            highlight['clip_mode'] = mode
+
+        copied = sum(1 for highlight in highlights if highlight.get('clip_mode') == 'copy')
+        logger.log(INFO, f"Exported {len(highlights)} highlights to {self.output_path}, {copied} stream copied")
+        return highlights
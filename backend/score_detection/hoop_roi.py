@@ -0,0 +1,82 @@
+# hoop_roi.py
+
+import math
+
+from utils import score_region
+
+
+class HoopROI:
+    """
+    Tracks whether the rim is stable enough to run ball detection on a crop around it.
+
+    Once the rim has been detected lock_frames times in a row without moving more than
+    max_jitter rim widths, a fixed size window covering the score region (scaled by margin)
+    is locked. Frames are then inferred on that window only, except for a full frame
+    refresh every refresh_interval frames. The lock is dropped if the rim moves or is not
+    seen for lock_frames inferred frames.
+
+    region_multipliers are the (width, above, below) of the score region the scoring
+    state machine checks, so the window covers all of it.
+    """
+    def __init__(self, lock_frames, max_jitter, margin, refresh_interval, region_multipliers=(2, 5.5, 0.9), stride=32):
+        self.lock_frames = lock_frames
+        self.max_jitter = max_jitter
+        self.margin = margin
+        self.refresh_interval = max(1, refresh_interval)
+        self.region_multipliers = region_multipliers
+        self.stride = stride
+
+        self.anchor = None        # hoop entry the stable run is measured against
+        self.stable_count = 0
+        self.missed_count = 0
+        self.window = None        # (x1, y1, x2, y2) in full frame pixels while locked
+        self.roi_frames = 0
+
+    def update(self, hoop, frame_width, frame_height):
+        """Called for every inferred frame with the hoop entry detected in it, or None"""
+        if hoop is None:
+            self.missed_count += 1
+            if self.missed_count >= self.lock_frames:
+                self._unlock()
+            return
+
+        self.missed_count = 0
+
+        if self.anchor is not None:
+            dist = math.sqrt((hoop[0][0] - self.anchor[0][0]) ** 2 + (hoop[0][1] - self.anchor[0][1]) ** 2)
+            if dist > self.max_jitter * self.anchor[2]:
+                self._unlock()
+
+        if self.anchor is None:
+            self.anchor = hoop
+
+        self.stable_count += 1
+        if self.window is None and self.stable_count >= self.lock_frames:
+            self.window = self._window(hoop, frame_width, frame_height)
+
+    def _unlock(self):
+        self.anchor = None
+        self.stable_count = 0
+        self.window = None
+
+    def _window(self, hoop, frame_width, frame_height):
+        """Crop around the score region, sized to a multiple of the model stride"""
+        x1, y1, x2, y2 = score_region(hoop, *self.region_multipliers)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+
+        width = min(frame_width, math.ceil((x2 - x1) * self.margin / self.stride) * self.stride)
+        height = min(frame_height, math.ceil((y2 - y1) * self.margin / self.stride) * self.stride)
+
+        # Shift the window inside the frame instead of shrinking it
+        left = int(min(max(0, cx - width / 2), frame_width - width))
+        top = int(min(max(0, cy - height / 2), frame_height - height))
+
+        return left, top, left + width, top + height
+
+    def crop_window(self, frame_count):
+        """Window to infer the frame on, None for a full frame inference"""
+        window = self.window
+        if window is None or frame_count % self.refresh_interval == 0:
+            return None
+        self.roi_frames += 1
+        return window
@@ -0,0 +1,120 @@
+# job_scheduler.py
+
+import itertools
+import threading
+import time
+from queue import PriorityQueue
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    def __init__(self, run_id, target, priority, seq):
+        self.run_id = run_id
+        self.target = target
+        self.priority = priority
+        self.seq = seq  # submission order
+        self.state = QUEUED
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'run_id': self.run_id,
+            'state': self.state,
+            'priority': self.priority,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobScheduler:
+    """
+    Runs processing jobs on a fixed number of worker threads.
+
+    Jobs wait in a priority queue, lower priority values run first and jobs with the
+    same priority run in submission order. Each job goes through queued -> running ->
+    done (or failed) and can be looked up by its run_id.
+    """
+    def __init__(self, num_workers=1):
+        self.num_workers = max(1, num_workers)
+        self.queue = PriorityQueue()
+        self.jobs = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker, name=f"job-worker-{i}")
+            worker.daemon = True
+            worker.start()
+
+    def submit(self, run_id, target, priority=0):
+        """Queue target() to run as job run_id"""
+        job = Job(run_id, target, priority, next(self.counter))
+        with self.lock:
+            self.jobs[run_id] = job
+        self.queue.put((priority, job.seq, job))
+        logger.log(INFO, f"Job {run_id} queued, priority {priority}")
+        return job
+
+    def status(self, run_id):
+        """Job state as a dict, or None for an unknown run_id"""
+        with self.lock:
+            job = self.jobs.get(run_id)
+            if job is None:
+                return None
+
+            status = job.to_dict()
+            if job.state == QUEUED:
+                # Position among queued jobs, 0 runs next
+                status['queue_position'] = sum(
+                    1 for other in self.jobs.values()
+                    if other.state == QUEUED and (other.priority, other.seq) < (job.priority, job.seq)
+                )
+            return status
+
+    def counts(self):
+        """Number of jobs in each state"""
+        with self.lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self.jobs.values():
+                counts[job.state] += 1
+            return counts
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+
+            with self.lock:
+                job.state = RUNNING
+                job.started_at = time.time()
+            logger.log(INFO, f"Job {job.run_id} started")
+
+            try:
+                job.target()
+                state = DONE
+            except Exception as e:
+                logger.log(INFO, f"Job {job.run_id} failed: {str(e)}")
+                job.error = str(e)
+                state = FAILED
+
+            with self.lock:
+                job.state = state
+                job.finished_at = time.time()
+            logger.log(INFO, f"Job {job.run_id} {state}")
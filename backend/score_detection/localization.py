@@ -12,6 +12,10 @@ from constants import (
     PENALTY_BOX_Y2,
 )
 
+from zone_index import (
+    ZONE_INDEX
+)
+
 from logger import (
     INFO,
     SOCKET,
@@ -95,15 +99,44 @@ class ShotLocalizer:
         """
         if not point[0] or not point[1]:
             return (None, None)
-        
-        logger.log(INFO, f"Mapping point: {point}")
 
-        # Convert point to proper format
-        point = np.array([[point[0]*self.image_width, point[1]*self.image_height]], dtype=float)
-        
-        
-        # Apply perspective transformation
-        transformed_point = cv2.perspectiveTransform(point.reshape(-1, 1, 2), self.homography_matrix)
+        transformed_point = self.map_points([point])
         
         # Return as a simple tuple
-        return (transformed_point[0][0][0], transformed_point[0][0][1])
\ No newline at end of file
+        return (transformed_point[0][0], transformed_point[0][1])
+
+    def map_points(self, points):
+        """
+        Map many points from video coordinates to court coordinates in one transformation
+
+        Args:
+            points: (n, 2) array or list of (x, y) coordinates in the video, relative to the
+                image dimensions, NaN (or None) for a missing location
+
+        Returns:
+            (n, 2) array of court coordinates, NaN for missing locations
+        """
+        points = np.array(points, dtype=float).reshape(-1, 2)
+        if not len(points):
+            return points
+
+        # Convert points to pixels, in the shape perspectiveTransform takes
+        pixels = points * (float(self.image_width), float(self.image_height))
+
+        # Apply perspective transformation
+        mapped = cv2.perspectiveTransform(pixels.reshape(-1, 1, 2), self.homography_matrix).reshape(-1, 2)
+        mapped[np.isnan(points).any(axis=1)] = np.nan
+        return mapped
+
+    def locate_shots(self, points):
+        """
+        Court coordinates and zones of many shot locations
+
+        Args:
+            points: (n, 2) video coordinates as taken by map_points
+
+        Returns:
+            ((n, 2) court coordinates, (n,) zone ids with NO_ZONE for shots without a zone)
+        """
+        mapped = self.map_points(points)
+        return mapped, ZONE_INDEX.lookup(mapped[:, 0], mapped[:, 1])
\ No newline at end of file
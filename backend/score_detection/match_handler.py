@@ -1,7 +1,9 @@
 # match_handler.py
 
 import threading
+import yaml
 from shot_detector import ShotDetector
+from chunked_processing import process_video_chunked
 from score_counter import (
     MatchScoreCounter, 
     ScoreCounter
@@ -15,6 +17,10 @@ from localization import (
     ShotLocalizer
 )
 
+from highlight_export import HighlightExporter
+from detection_cache import DetectionLog
+from profiler import SamplingProfiler
+
 from utils import get_time_string
 import os
 import uuid
@@ -27,6 +33,8 @@ from logger import (
     Logger
 )
 
+env = yaml.load(open('config.yaml', 'r'), Loader=yaml.SafeLoader)
+
 logger = Logger([
     INFO
 ])
@@ -37,7 +45,8 @@ class MatchHandler:
                  points1=None, points2=None, 
                  image_dimensions1=None, image_dimensions2=None,
                  on_detection_callback=None, on_complete_callback=None,
-                 run_id=None):
+                 run_id=None, checkpoints=None, detection_cache=None,
+                 upload_ids=None, uploads=None, live=False, profile=False):
         """
         Initialize the match handler with two videos
         
@@ -53,6 +62,13 @@ class MatchHandler:
             image_dimensions2: Dimensions of video2
             on_detection_callback: Callback for shot detection
             on_complete_callback: Callback for completion
+            run_id: Unique ID for this run
+            checkpoints: CheckpointStore to save progress to, processing resumes from existing checkpoints
+            detection_cache: DetectionCache to reuse the attempts of videos processed before
+            upload_ids: Upload IDs of video1 and video2 if they were sent through the upload API
+            uploads: UploadStore of those uploads, unfinished ones are processed while they arrive
+            live: Whether the video paths are live stream URLs or pipes
+            profile: Whether to profile the run, the profile is saved to data/{run_id}.profile.json
         """
         self.video1_path = video1_path
         self.video2_path = video2_path
@@ -63,6 +79,12 @@ class MatchHandler:
         self.switch_time = switch_time
         self.is_match = is_match
         self.run_id = run_id  # Unique ID for this run, can be used for logging or tracking
+        self.checkpoints = checkpoints
+        self.detection_cache = detection_cache
+        self.upload_ids = upload_ids or [None, None]
+        self.uploads = uploads
+        self.live = live
+        self.profiler = SamplingProfiler(env.get('profile_interval_ms', 20) / 1000) if profile else None
         
         # Initialize score counter
         self.score_counter = None
@@ -96,8 +118,16 @@ class MatchHandler:
         self.shot_data_team_A = []
         self.shot_data_team_B = []
 
+        # Highlight window of every shot, clips are cut from these once processing completes
+        self.highlights = []
+
+        # Run reports from each detector, keyed by video_id
+        self.processing_reports = {}
+
         # Thread synchronization
         self.lock = threading.Lock()
+        self.threads = []
+        self.errors = []  # exceptions the video threads stopped with, raised by process()
         
     def on_shot_detection(self, timestamp, success, video_id, shot_location=None):
         """Callback for shot detection from either detector"""
@@ -134,12 +164,28 @@ class MatchHandler:
         elif team_id == 'B':
             self.shot_data_team_B.append(shot)
 
+        with self.lock:
+            self.highlights.append({
+                'video_id': video_id,
+                'team': team_id,
+                'success': success,
+                'quarter': shot.quarter if shot else None,
+                'timestamp': timestring,
+                'start_time': start_time,
+                'end_time': end_time,
+                'start': max(0, timestamp - 4000) / 1000,
+                'end': (timestamp + 5000) / 1000
+            })
+
         if self.on_detection_callback:
             self.on_detection_callback(self.run_id, start_time, end_time, success, team_id, video_id)
     
-    def on_team_complete(self, video_id):
+    def on_team_complete(self, video_id, report=None):
         """Callback when either detector completes"""
         with self.lock:
+            if report is not None:
+                self.processing_reports[video_id] = report
+
             #TODO: results do not need to be returned, directly get from score counter after both finished
             if video_id == 1:
                 self.video_1_complete = True
@@ -149,39 +195,106 @@ class MatchHandler:
             # If both completed, call final callback
 
             #TODO: implement and call statistic class here
-            if self.video_1_complete and self.video_2_complete:
-                results = {}
-                results['is_match'] = self.is_match
+            if not (self.video_1_complete and self.video_2_complete):
+                return
 
-                # Write shot data
-                if self.is_match:
+            results = {}
+            results['is_match'] = self.is_match
 
-                    results['team_A'] = self.stats_team_A.get_statistics()
-                    results['team_B'] = self.stats_team_B.get_statistics()
-                
-                else:
+            # Write shot data
+            if self.is_match:
 
-                    results.update(self.stats_team_A.get_statistics())
-                
-                
-                if self.on_complete_callback:
-                    self.on_complete_callback(self.run_id, results, self.is_match)
+                results['team_A'] = self.stats_team_A.get_statistics()
+                results['team_B'] = self.stats_team_B.get_statistics()
+            
+            else:
+
+                results.update(self.stats_team_A.get_statistics())
+
+            # Taken under the lock, highlights are exported and results saved after releasing it
+            shot_data_team_A = [shot.__dict__ for shot in self.shot_data_team_A]
+            shot_data_team_B = [shot.__dict__ for shot in self.shot_data_team_B]
+            highlights = list(self.highlights)
+            processing_reports = dict(self.processing_reports)
+        
+        if self.on_complete_callback:
+            self.on_complete_callback(self.run_id, results, self.is_match)
+
+        os.makedirs(f'data', exist_ok=True)
+
+        # Save shot data to file
+        if self.is_match:
+            results['team_A']['shot_data'] = shot_data_team_A
+            results['team_B']['shot_data'] = shot_data_team_B
+        else:
+            results['shot_data'] = shot_data_team_A
+
+        # Processing details per video, e.g. frame ranges skipped by the activity gate
+        results['processing'] = {f'video_{video_id}': report for video_id, report in processing_reports.items()}
+
+        results['highlights'] = self._export_highlights(highlights)
+
+        if self.profiler:
+            results['profile'] = self._save_profile(processing_reports)
+
+        # Source videos, highlight reels are cut from them on request
+        if not self.live:
+            results['video_paths'] = {video_id: path for video_id, path in ((1, self.video1_path), (2, self.video2_path)) if path}
 
-                os.makedirs(f'data', exist_ok=True)
+        # Save to JSON file
+        logger.log(INFO, f"Saving results to data/{self.run_id}.json: {results}")
+        with open(f'data/{self.run_id}.json', 'w') as f:
+            json.dump(results, f, indent=4)
 
-                # Save shot data to file
-                if self.is_match:
-                    results['team_A']['shot_data'] = [shot.__dict__ for shot in self.shot_data_team_A]
-                    results['team_B']['shot_data'] = [shot.__dict__ for shot in self.shot_data_team_B]
-                else:
-                    results['shot_data'] = [shot.__dict__ for shot in self.shot_data_team_A]
+        # Run is finished, nothing to resume
+        if self.checkpoints:
+            self.checkpoints.clear(self.run_id)
 
-                # Save to JSON file
-                logger.log(INFO, f"Saving results to data/{self.run_id}.json: {results}")
-                with open(f'data/{self.run_id}.json', 'w') as f:
-                    json.dump(results, f, indent=4)
 
 
+    def _save_profile(self, processing_reports):
+        """Stop the profiler and save its report with counters of every video, returns the file name"""
+        self.profiler.stop()
+
+        videos = {}
+        for video_id, report in processing_reports.items():
+            stages = report.get('stage_timings', {})
+            videos[f'video_{video_id}'] = {
+                'frames_processed': report.get('frames', 0),
+                'frames_skipped': report.get('frames', 0) - report.get('inferred_frames', 0),
+                'dropped_frames': report.get('dropped_frames', 0),
+                'cached': report.get('cached', False),
+                'inferences': {
+                    'main': {
+                        'batches': stages.get('inference', {}).get('count', 0),
+                        'frames': report.get('inferred_frames', 0)
+                    },
+                    'shoot': stages.get('shoot_inference', {}).get('count', 0)
+                },
+                'stage_timings': stages
+            }
+
+        profile = {'run_id': self.run_id, 'videos': videos, **self.profiler.report()}
+
+        file_name = f'{self.run_id}.profile.json'
+        with open(os.path.join('data', file_name), 'w') as f:
+            json.dump(profile, f, indent=4)
+        logger.log(INFO, f"Saved profile of run {self.run_id} to data/{file_name}")
+        return file_name
+
+    def _export_highlights(self, highlights):
+        """Cut a clip for every highlight into data/{run_id}_clips when enabled"""
+        highlights = sorted(highlights, key=lambda highlight: (highlight['video_id'], highlight['start']))
+        if not env.get('highlight_export', False) or self.live:
+            return highlights
+
+        exporter = HighlightExporter(
+            os.path.join(env['data_path'], f'{self.run_id}_clips'),
+            env.get('highlight_max_lead_seconds', 2),
+            env.get('ffmpeg_path', 'ffmpeg'),
+            env.get('ffprobe_path', 'ffprobe')
+        )
+        return exporter.export_all(highlights, {1: self.video1_path, 2: self.video2_path})
 
     def _get_team_from_video_id(self, video_id, timestring):
         """Get team ID from video ID and timestring"""
@@ -198,9 +311,12 @@ class MatchHandler:
     
     def start_processing(self):
         """Start processing both videos in separate threads"""
+        if self.profiler:
+            self.profiler.start()
+
         # Start Team A video processing
         thread_a = threading.Thread(
-            target=self._process_video,
+            target=self._run_video,
             args=(self.video1_path, 1)
         )
         
@@ -210,7 +326,7 @@ class MatchHandler:
         if self.is_match:
         # Start Team B video processing
             thread_b = threading.Thread(
-                target=self._process_video, 
+                target=self._run_video,
                 args=(self.video2_path, 2)
             )
         
@@ -220,28 +336,125 @@ class MatchHandler:
         
         if thread_b:
             thread_b.start()
+
+        self.threads = [thread for thread in (thread_a, thread_b) if thread]
         
         return "Processing started"
+
+    def process(self):
+        """Process both videos and block until both have completed, used as a scheduler job"""
+        self.start_processing()
+        for thread in self.threads:
+            thread.join()
+
+        if self.profiler:
+            self.profiler.stop()
+
+        if self.errors:
+            raise self.errors[0]
+        if not (self.video_1_complete and self.video_2_complete):
+            raise RuntimeError(f"Processing of run {self.run_id} did not complete")
     
+    def _run_video(self, video_path, video_id):
+        """Thread target, keeps the error processing failed with for process()"""
+        try:
+            self._process_video(video_path, video_id)
+        except Exception as e:
+            logger.log(INFO, f"Processing of video {video_id} failed: {str(e)}")
+            self.errors.append(e)
+
     # Entry point of video processing
     def _process_video(self, video_path, video_id):
         """Process a single video for the specified team"""
+        events = []
+        reports = []
+
         def on_detection(timestamp, success, _video_id, shot_location=None):
             # Here we intercept the detection and associate it with the team
+            events.append((timestamp, success, _video_id, shot_location))
             self.on_shot_detection(timestamp, success, _video_id, shot_location)
             
-        def on_complete():
+        def on_complete(report=None):
             # Process completion for this team
-            self.on_team_complete(video_id)
+            reports.append(report)
+            self.on_team_complete(video_id, report)
+
+        # Live streams are processed as they arrive, there is nothing to cache, split or resume
+        if self.live:
+            ShotDetector(
+                video_path,
+                on_detection,
+                on_complete,
+                show_vid=False,
+                video_id=video_id,
+                live=True,
+                profiler=self.profiler
+            )
+            return
+
+        # Follow a video that is still being uploaded instead of waiting for all of it
+        follow_upload = None
+        upload_id = self.upload_ids[video_id - 1]
+        if self.uploads and upload_id and env.get('tail_follow_uploads', False) and not self.uploads.is_complete(upload_id):
+            follow_upload = lambda: self.uploads.is_complete(upload_id)
+            logger.log(INFO, f"Processing video {video_id} while upload {upload_id} is in progress")
+
+        # A video processed before with the same weights only replays its attempts,
+        # an unfinished upload can't be hashed yet
+        cache_key = None
+        if self.detection_cache and not follow_upload:
+            cache_key = self.detection_cache.key(video_path)
+            cached = self.detection_cache.load(cache_key)
+            if cached:
+                cached_events, report = cached
+                logger.log(INFO, f"Replaying {len(cached_events)} cached attempts for video {video_id}")
+                for timestamp, success, _, shot_location in cached_events:
+                    self.on_shot_detection(timestamp, success, video_id, shot_location)
+                self.on_team_complete(video_id, {**report, 'cached': True})
+                return
+
+        # Split long videos into chunks processed in parallel, the merged attempts are
+        # handled exactly like those of a single detector (chunks are not checkpointed)
+        num_chunks = env.get('parallel_chunks', 1)
+        chunked = None
+        if num_chunks > 1 and not follow_upload:
+            chunked = process_video_chunked(video_path, video_id, num_chunks, env.get('chunk_overlap_seconds', 5))
+        if chunked:
+            chunk_events, report = chunked
+            for event in chunk_events:
+                on_detection(*event)
+            on_complete(report)
+
+            if cache_key:
+                self.detection_cache.save(cache_key, events, report)
+            return
         
         # Create and run detector
         # Note: We need to modify ShotDetector to accept video_id parameter
         # and return shot_location when it detects a shot
-        ShotDetector(
+        dump_detections = env.get('detection_dump', False)
+        detection_log = DetectionLog() if self.detection_cache or dump_detections else None
+        detector = ShotDetector(
             video_path, 
             on_detection, 
             on_complete, 
             show_vid=False,
             video_id=video_id,  # New parameter to identify the team
-            score_counter=self.score_counter  # Pass the shared score counter
-        )
\ No newline at end of file
+            score_counter=self.score_counter,  # Pass the shared score counter
+            checkpoint=self.checkpoints.for_video(self.run_id, video_id) if self.checkpoints else None,
+            detection_log=detection_log,
+            follow_upload=follow_upload,
+            profiler=self.profiler
+        )
+
+        if self.detection_cache and reports:
+            # Detections before a resumed checkpoint are lost, only cache the attempts then
+            cache_key = cache_key or self.detection_cache.key(video_path)
+            self.detection_cache.save(cache_key, events, reports[0], detection_log if detector.start_frame == 0 else None)
+
+        # Detections of the whole video for tuning the scoring parameters with replay.py
+        if dump_detections and reports and detector.start_frame == 0:
+            os.makedirs(env['data_path'], exist_ok=True)
+            dump_path = os.path.join(env['data_path'], f'{self.run_id}_video{video_id}_detections.npz')
+            detection_log.save(dump_path)
+            logger.log(INFO, f"Saved detections of video {video_id} to {dump_path}")
@@ -0,0 +1,88 @@
+# model_registry.py
+
+import threading
+from queue import Queue
+import numpy as np
+import yaml
+
+from logger import (
+    INFO,
+    Logger
+)
+
+env = yaml.load(open('config.yaml', 'r'), Loader=yaml.SafeLoader)
+
+logger = Logger([
+    INFO
+])
+
+
+def load_yolo(weights_path):
+    # Imported on first use, so tools running stub models don't need ultralytics
+    from ultralytics import YOLO
+    return YOLO(weights_path, verbose=False)
+
+
+class InferenceHandle:
+    """
+    Thread-safe handle to a pool of YOLO models loaded from the same weights file.
+
+    YOLO predictors are not safe to share between threads, so each call checks out one
+    model instance from the pool and returns it once the results have been consumed.
+    Calls take the same arguments as calling a YOLO model and return a list of results.
+    """
+    def __init__(self, weights_path, pool_size=1, model_factory=load_yolo):
+        self.weights_path = weights_path
+        self.pool = Queue()
+        for _ in range(max(1, pool_size)):
+            self.pool.put(model_factory(weights_path))
+
+    def __call__(self, source, **kwargs):
+        model = self.pool.get()
+        try:
+            # Results of stream=True are generators, consume them while the model is checked out
+            return list(model(source, **kwargs))
+        finally:
+            self.pool.put(model)
+
+    def warmup(self, height, width, device=0):
+        """Run a blank image of the given shape through every model in the pool"""
+        dummy = np.zeros((height, width, 3), dtype=np.uint8)
+        models = [self.pool.get() for _ in range(self.pool.qsize())]
+        try:
+            for model in models:
+                list(model(dummy, stream=True, verbose=False, imgsz=width, device=device))
+        finally:
+            for model in models:
+                self.pool.put(model)
+
+
+class ModelRegistry:
+    """Loads each weights file once per process and hands out shared inference handles"""
+    def __init__(self, pool_size=1):
+        self.pool_size = pool_size
+        self.handles = {}
+        self.lock = threading.Lock()
+
+    def get(self, weights_path):
+        with self.lock:
+            if weights_path not in self.handles:
+                logger.log(INFO, f"Loading model: {weights_path}")
+                self.handles[weights_path] = InferenceHandle(weights_path, self.pool_size)
+            return self.handles[weights_path]
+
+    def register(self, weights_path, model_factory):
+        """Serve weights_path with models from model_factory(weights_path), e.g. stubs for benchmarks"""
+        with self.lock:
+            self.handles[weights_path] = InferenceHandle(weights_path, self.pool_size, model_factory)
+
+    def warmup(self, weights_paths, height, width, device=0):
+        """Load and warm up models, so the first upload does not pay for it"""
+        for weights_path in weights_paths:
+            handle = self.get(weights_path)
+            logger.log(INFO, f"Warming up model: {weights_path} at {width} X {height}")
+            handle.warmup(height, width, device)
+
+
+# Process-wide registry shared by all ShotDetector instances
+registry = ModelRegistry(env.get('model_pool_size', 1))
@@ -0,0 +1,135 @@
+# profiler.py
+
+import os
+import resource
+import sys
+import threading
+import time
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+
+def current_rss_mb():
+    """Resident memory of the process, the peak so far where /proc is not available"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the threads of a run.
+
+    A background thread looks at the stacks of the watched threads every interval seconds
+    and adds the time since the last sample to the function on top of each stack (self
+    time) and to every function on it (total time). Nothing is traced, so the cost does
+    not depend on how much the watched threads do. Time spent blocked, e.g. waiting on a
+    queue, shows up as self time of the waiting function.
+    """
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.threads = {}    # thread ident -> name
+        self.functions = {}  # name -> {(filename, line, function): [self seconds, total seconds]}
+        self.samples = 0
+        self.peak_rss_mb = 0
+        self.started_at = None
+        self.stopped_at = None
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def watch(self, name, thread=None):
+        """Sample thread (the calling thread by default) under name, the thread must be started"""
+        thread = thread or threading.current_thread()
+        with self.lock:
+            self.threads[thread.ident] = name
+
+    def start(self):
+        self.started_at = time.time()
+        self.sampler = threading.Thread(target=self._sample)
+        self.sampler.daemon = True
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.sampler:
+            self.sampler.join(timeout=5.0)
+        self.stopped_at = time.time()
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+
+            frames = sys._current_frames()
+            with self.lock:
+                threads = list(self.threads.items())
+
+                for ident, name in threads:
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+
+                    functions = self.functions.setdefault(name, {})
+                    seen = set()
+                    top = True
+                    while frame is not None:
+                        code = frame.f_code
+                        key = (code.co_filename, code.co_firstlineno, code.co_name)
+                        entry = functions.setdefault(key, [0.0, 0.0])
+                        if top:
+                            entry[0] += elapsed
+                            top = False
+                        # Recursive functions only count once per sample
+                        if key not in seen:
+                            entry[1] += elapsed
+                            seen.add(key)
+                        frame = frame.f_back
+
+                self.samples += 1
+            del frames
+
+            self.peak_rss_mb = max(self.peak_rss_mb, current_rss_mb())
+
+    def report(self, top=30):
+        """The top functions of every watched thread by total and by self time"""
+        def summary(functions, index):
+            ranked = sorted(functions.items(), key=lambda item: -item[1][index])[:top]
+            return [
+                {
+                    'function': function,
+                    'file': os.path.basename(filename),
+                    'line': line,
+                    'self_s': round(self_time, 3),
+                    'total_s': round(total_time, 3)
+                }
+                for (filename, line, function), (self_time, total_time) in ranked
+            ]
+
+        with self.lock:
+            threads = {
+                name: {
+                    'by_total': summary(functions, 1),
+                    'by_self': summary(functions, 0)
+                }
+                for name, functions in self.functions.items()
+            }
+
+        return {
+            'interval_s': self.interval,
+            'samples': self.samples,
+            'wall_s': round((self.stopped_at or time.time()) - self.started_at, 3) if self.started_at else 0,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'threads': threads
+        }
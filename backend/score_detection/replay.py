@@ -0,0 +1,168 @@
+# replay.py
+#
+# Runs the scoring state machine on detections saved by earlier runs, for a grid of
+# scoring parameters, without running the models again. Detections are saved with
+# detection_dump: True in config.yaml, entries of the detection cache have them too:
+#
+#   python replay.py data/<run_id>_video1_detections.npz cache/<key>/detections.npz \
+#       --grid score_conf_threshold=0.6,0.7,0.8 --grid score_region_above=4.5,5.5,6.5
+#
+# Parameters that are not swept are those of the run that saved the detections, so a
+# replay without --grid gives the attempts of that run, ball tracker predictions in the
+# frames the main model skipped included. Detections saved without them use config.yaml
+# in the working directory if it exists, otherwise the defaults in scoring.py.
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import yaml
+
+from detection_cache import MAIN_MODEL
+from scoring import ScoringStateMachine, SCORING_DEFAULTS, scoring_params
+
+
+class AttemptRecorder(ScoringStateMachine):
+    """State machine that only records its attempts as (timestamp, scored)"""
+    def __init__(self, frame_rate, params=None):
+        super().__init__(frame_rate, params)
+        self.events = []
+
+    def on_attempt(self, scored):
+        self.events.append((self.timestamp, scored))
+
+
+class Replay:
+    """The main model detections of one video, grouped by frame for the state machine"""
+    def __init__(self, detections, frame_rate=None, classes=None, params=None):
+        """
+        detections is the path of a .npz file or its arrays, e.g. from DetectionLog.to_arrays().
+        params are the scoring parameters for detections saved without those of their run.
+        """
+        data = np.load(detections) if isinstance(detections, str) else detections
+        self.path = detections if isinstance(detections, str) else None
+
+        if frame_rate is None and 'frame_rate' not in data:
+            raise ValueError(f"{self.path or 'Detections'} has no frame rate, pass it with --fps")
+        self.frame_rate = float(frame_rate or data['frame_rate'])
+        classes = classes or (data['classes'].tolist() if 'classes' in data else ['ball', 'rim'])
+        self.params = json.loads(str(data['scoring'])) if 'scoring' in data else dict(params or SCORING_DEFAULTS)
+
+        main = data['model'] == MAIN_MODEL
+        frame = data['frame'][main]
+        cls = data['cls'][main]
+        conf = data['conf'][main]
+        xyxy = data['xyxy'][main]
+
+        # Boxes of a frame by decreasing confidence like ShotDetector.update_positions,
+        # lexsort is stable so ties keep the order the model returned them in
+        order = np.lexsort((-conf, frame))
+        frame, cls, conf, xyxy = frame[order], cls[order], conf[order], xyxy[order]
+
+        # round_conf() in the float32 precision the model confidences have
+        rounded = np.ceil(conf * np.float32(100)).astype(np.float64) / 100
+
+        names = [classes[i] for i in cls.tolist()]
+        boxes = [tuple(box) for box in xyxy.tolist()]
+        starts = np.searchsorted(frame, data['frame_count'], 'left').tolist()
+        ends = np.searchsorted(frame, data['frame_count'], 'right').tolist()
+
+        # (frame_count, timestamp, boxes or None if the frame was not inferred)
+        self.frames = [
+            (frame_count, timestamp, list(zip(names[start:end], boxes[start:end], rounded[start:end].tolist())) if inferred else None)
+            for frame_count, timestamp, inferred, start, end in zip(
+                data['frame_count'].tolist(), data['timestamp'].tolist(), data['inferred'].tolist(), starts, ends
+            )
+        ]
+
+    def run(self, params=None):
+        """State machine run over all frames, params override the scoring parameters of the replay"""
+        machine = AttemptRecorder(self.frame_rate, {**self.params, **(params or {})})
+        for frame_count, timestamp, boxes in self.frames:
+            machine.step(frame_count, timestamp, boxes)
+        return machine
+
+
+def parse_grid(grid_args):
+    """['key=1,2', ...] -> list of parameter dicts, one per combination"""
+    keys, values = [], []
+    for arg in grid_args:
+        key, _, options = arg.partition('=')
+        if key not in SCORING_DEFAULTS:
+            raise ValueError(f"Unknown scoring parameter {key}, one of {', '.join(SCORING_DEFAULTS)}")
+        keys.append(key)
+        values.append([float(option) for option in options.split(',')])
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+# Replays loaded once per worker process
+_replays = []
+
+
+def _load(paths, frame_rate, base):
+    _replays[:] = [Replay(path, frame_rate, params=base) for path in paths]
+
+
+def _run_setting(params):
+    start = time.perf_counter()
+    videos = {}
+    for replay in _replays:
+        machine = replay.run(params)
+        videos[replay.path] = {
+            'params': machine.params,
+            'attempts': machine.attempts,
+            'makes': machine.makes,
+            'events': machine.events
+        }
+    seconds = time.perf_counter() - start
+
+    return {
+        'params': params,
+        'attempts': sum(video['attempts'] for video in videos.values()),
+        'makes': sum(video['makes'] for video in videos.values()),
+        'frames_per_second': round(sum(len(replay.frames) for replay in _replays) / seconds) if seconds else None,
+        'videos': videos
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay saved detections through the scoring state machine")
+    parser.add_argument('detections', nargs='+', help="detections .npz files")
+    parser.add_argument('--grid', action='append', default=[], help="parameter=value1,value2,... to sweep, can be repeated")
+    parser.add_argument('--fps', type=float, help="frame rate of videos whose detections don't have it")
+    parser.add_argument('--workers', type=int, default=1, help="processes to run settings in")
+    parser.add_argument('--output', help="write the JSON results here")
+    args = parser.parse_args()
+
+    base = dict(SCORING_DEFAULTS)
+    if os.path.exists('config.yaml'):
+        base = scoring_params(yaml.load(open('config.yaml', 'r'), Loader=yaml.SafeLoader))
+    settings = parse_grid(args.grid)
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(args.workers, initializer=_load, initargs=(args.detections, args.fps, base)) as pool:
+            results = pool.map(_run_setting, settings)
+    else:
+        _load(args.detections, args.fps, base)
+        results = [_run_setting(params) for params in settings]
+    seconds = time.perf_counter() - start
+
+    swept = [arg.partition('=')[0] for arg in args.grid]
+    for result in results:
+        values = ', '.join(f"{key}={result['params'][key]:g}" for key in swept) or 'recorded'
+        print(f"{values}: {result['makes']} / {result['attempts']} ({result['frames_per_second']} frames/s)")
+    print(f"{len(results)} settings in {seconds:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'base': base, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
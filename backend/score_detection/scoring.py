@@ -0,0 +1,240 @@
+# scoring.py
+
+import math
+
+from trajectory import Trajectory
+from tracker import BallTracker
+from utils import (
+    clean_hoop_pos,
+    clean_ball_pos,
+    detect_score,
+    in_score_region,
+    score_region
+)
+
+# Time after an attempt during which no new attempt is registered
+MISS_ATTEMPT_COOLDOWN_SECONDS = 2.5
+MADE_ATTEMPT_COOLDOWN_SECONDS = 3
+
+# clean_ball_pos keeps about 90 frames of ball positions, clean_hoop_pos 40 rim positions
+BALL_TRAJECTORY_CAPACITY = 128
+HOOP_TRAJECTORY_CAPACITY = 64
+
+# Tunable parameters of the state machine, overridden by config keys of the same name
+SCORING_DEFAULTS = {
+    'score_conf_threshold': 0.7,        # ball / rim boxes need a higher confidence to be tracked
+    'score_region_width': 2,            # half width of the score region, in rim widths
+    'score_region_above': 5.5,          # height of the score region above the rim, in rim heights
+    'score_region_below': 0.9,          # depth of the score region below the rim, in rim heights
+    'attempt_detection_seconds': 0.3,   # time the ball spends around the rim before a miss is counted
+    'miss_cooldown_seconds': MISS_ATTEMPT_COOLDOWN_SECONDS,
+    'made_cooldown_seconds': MADE_ATTEMPT_COOLDOWN_SECONDS,
+    'ball_tracker': False,              # gate ball detections with a Kalman filter and predict missed frames
+    'ball_tracker_max_coast': 3,        # frames in a row the ball position is predicted without a detection
+    'ball_tracker_gate': 9.21           # max squared normalized distance of a detection from the prediction
+}
+
+
+def scoring_params(config):
+    """SCORING_DEFAULTS overridden by the keys of the same name in config"""
+    return {key: config.get(key, default) for key, default in SCORING_DEFAULTS.items()}
+
+
+def round_conf(conf):
+    """Confidence rounded up to 2 decimals, as compared against score_conf_threshold"""
+    return math.ceil(conf * 100) / 100
+
+
+class ScoringStateMachine:
+    """
+    Ball and rim tracking and the made / missed attempt state machine, fed with the ball
+    and rim detections of one frame at a time.
+
+    ShotDetector runs it on model results as they come in, replay.py on detections dumped
+    by an earlier run. Subclasses act on attempts by overriding on_attempt().
+    """
+    def __init__(self, frame_rate, params=None):
+        self.params = {**SCORING_DEFAULTS, **(params or {})}
+        self.frame_rate = frame_rate
+
+        self.ball_pos = Trajectory(BALL_TRAJECTORY_CAPACITY)  # entries ((x_pos, y_pos), frame count, width, height, conf)
+        self.hoop_pos = Trajectory(HOOP_TRAJECTORY_CAPACITY)  # entries ((x_pos, y_pos), frame count, width, height, conf)
+        self.frame_count = 0
+        self.timestamp = None
+
+        self.makes = 0
+        self.attempts = 0
+        self.attempt_cooldown = 0
+        self.attempt_time = 0
+        self.ball_entered = False
+        self.last_point_in_region = None
+
+        # For marking if the ball / rim have been detected in the current frame
+        self.ball_detected = False
+        self.rim_detected = False
+        self.rim_last_detected = -1
+
+        # First frame attempts are detected again
+        self.cooldown_until = 0
+
+        self.conf_threshold = self.params['score_conf_threshold']
+        self.region_multipliers = (
+            self.params['score_region_width'],
+            self.params['score_region_above'],
+            self.params['score_region_below']
+        )
+        # Predicted ball positions have conf 0 in ball_pos
+        self.ball_tracker = None
+        if self.params['ball_tracker']:
+            self.ball_tracker = BallTracker(int(self.params['ball_tracker_max_coast']), self.params['ball_tracker_gate'])
+
+        self.MISS_ATTEMPT_COOLDOWN = int(frame_rate * self.params['miss_cooldown_seconds'])
+        self.MADE_ATTEMPT_COOLDOWN = int(frame_rate * self.params['made_cooldown_seconds'])
+        self.ATTEMPT_DETECTION_INTERVAL = int(frame_rate * self.params['attempt_detection_seconds'])
+
+    def begin_frame(self, frame_count, timestamp):
+        """Start a frame, frame_count may skip ahead when the source dropped frames"""
+        # Keep frame based counters in step with the source
+        dropped = frame_count - self.frame_count
+        if dropped > 0:
+            self.frame_count = frame_count
+            self.attempt_cooldown = max(0, self.attempt_cooldown - dropped)
+
+        self.timestamp = timestamp
+        self.ball_detected, self.rim_detected = False, False
+
+    def add_box(self, current_class, box, conf):
+        """
+        Track a ball or rim box (x1, y1, x2, y2) in full frame pixels, with conf from
+        round_conf(). Boxes have to be added by decreasing confidence, only the first ball
+        and rim above the threshold are used. Returns whether the box was used.
+        """
+        if conf <= self.conf_threshold:
+            return False
+
+        x1, y1, x2, y2 = box
+        w, h = x2 - x1, y2 - y1
+        center = (int(x1 + w / 2), int(y1 + h / 2))
+
+        if current_class == 'rim' and not self.rim_detected:
+            self.rim_detected = True
+            self.rim_last_detected = self.frame_count
+            self.hoop_pos.append(center, self.frame_count, w, h, conf)
+            return True
+        if current_class == 'ball' and not self.ball_detected:
+            if self.ball_tracker and not self.ball_tracker.update(center, w, h, self.frame_count):
+                return False
+            self.ball_detected = True
+            self.ball_pos.append(center, self.frame_count, w, h, conf)
+            return True
+        return False
+
+    def predict_ball(self):
+        """Add the predicted ball position if the frame had no ball detection and the tracker has a track"""
+        if not self.ball_tracker or self.ball_detected:
+            return
+        predicted = self.ball_tracker.coast(self.frame_count)
+        if predicted:
+            center, w, h = predicted
+            self.ball_detected = True
+            self.ball_pos.append(center, self.frame_count, w, h, 0.0)
+
+    def finish_frame(self):
+        self.frame_count += 1
+
+        if self.attempt_cooldown > 0:
+            self.attempt_cooldown -= 1
+
+    def step(self, frame_count, timestamp, boxes):
+        """
+        Run a whole frame, boxes is None if the frame was not inferred, otherwise a list of
+        (class name, (x1, y1, x2, y2), conf) sorted by decreasing confidence.
+        """
+        self.begin_frame(frame_count, timestamp)
+        if boxes is not None:
+            for current_class, box, conf in boxes:
+                if self.ball_detected and self.rim_detected:
+                    break
+                self.add_box(current_class, box, conf)
+        self.predict_ball()
+        self.clean_motion()
+        self.score_detection()
+        self.finish_frame()
+
+    def score_region(self):
+        """Score region (x1, y1, x2, y2) around the last known rim, or None"""
+        if not self.hoop_pos:
+            return None
+        return score_region(self.hoop_pos[-1], *self.region_multipliers)
+
+    # Function to clean likely erroneous detections
+    def clean_motion(self):
+        # Clean and display ball motion
+        # The tracker already rejected detections that jump away from the ball
+        self.ball_pos = clean_ball_pos(self.ball_pos, self.frame_count, reject_jumps=self.ball_tracker is None)
+
+        # Clean hoop motion and display current hoop center
+        if len(self.hoop_pos) > 1:
+            self.hoop_pos = clean_hoop_pos(self.hoop_pos)
+
+    # Function to handle scoring moment detection logic
+    def score_detection(self):
+        #only execute if hoop and ball pos is known
+        if len(self.hoop_pos) > 0 and len(self.ball_pos) > 0:
+
+            # Made: Enters hoop region, shortly after enters down region,
+            # Attempt: Enters up region, then exits up region without entering hoop region
+
+            if self.frame_count - self.rim_last_detected < self.frame_rate and self.ball_detected and self.attempt_cooldown == 0:
+                if in_score_region(self.ball_pos, self.hoop_pos, *self.region_multipliers):
+                    if self.ball_entered:
+                        self.attempt_time += 1
+                    else:
+                        self.ball_entered = True
+                        self.attempt_time = 1
+
+
+                    #Add linear interpolation
+                    if not self.last_point_in_region:
+                        self.last_point_in_region = self.ball_pos[-1]
+                        scored = False
+                    else:
+                        scored = detect_score(self.ball_pos, self.hoop_pos, self.last_point_in_region)
+
+                    if scored:
+                        self.makes += 1
+                        self.attempts += 1
+                        self.on_attempt(True)
+
+                        self.start_cooldown(self.MADE_ATTEMPT_COOLDOWN)
+                        self.last_point_in_region = None
+                        self.ball_entered = False
+                        self.attempt_time = 0
+
+                    else:
+                        self.last_point_in_region = self.ball_pos[-1]
+
+
+                else:
+                    if self.ball_entered:
+                        self.attempt_time += 1
+
+                    if self.attempt_time >= self.ATTEMPT_DETECTION_INTERVAL:
+                        self.attempts += 1
+                        self.on_attempt(False)
+
+                        self.start_cooldown(self.MISS_ATTEMPT_COOLDOWN)
+
+                        self.attempt_time = 0
+                        self.ball_entered = False
+                        self.last_point_in_region = None
+
+    def on_attempt(self, scored):
+        """Called at the frame an attempt is detected, scored is True for a made shot"""
+        pass
+
+    # No attempt can be registered for the given number of frames
+    def start_cooldown(self, frames):
+        self.attempt_cooldown = frames
+        # First frame attempts are detected again, read by the decode stage
+        self.cooldown_until = self.frame_count + frames
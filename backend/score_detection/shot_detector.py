@@ -1,6 +1,5 @@
 # TODO: Review changes needed here
 from PIL import Image
-from ultralytics import YOLO
 import cv2
 import cvzone
 import math
@@ -12,16 +11,10 @@ from datetime import timedelta, datetime
 import time
 from enum import Enum
 import threading
-from queue import Queue, Empty
-from copy import copy
-
-from utils import (
-    clean_hoop_pos, 
-    clean_ball_pos, 
-    detect_score, 
-    in_score_region,
-    get_time_string
-)
+import argparse
+from queue import Queue, Empty, Full
+
+from utils import get_time_string
 
 from score_counter import (
     ScoreCounter,
@@ -29,6 +22,24 @@ from score_counter import (
 )
 
 
+from frame_buffer import FrameRingBuffer
+from model_registry import registry
+from result_cache import ResultCache
+from activity_gate import ActivityGate
+from hoop_roi import HoopROI
+from detection_cache import MAIN_MODEL, SHOOT_MODEL
+from video_capture import TailFollowCapture, LiveCapture
+from timing import StageTimings
+from trajectory import Trajectory
+from scoring import (
+    ScoringStateMachine,
+    BALL_TRAJECTORY_CAPACITY,
+    HOOP_TRAJECTORY_CAPACITY,
+    round_conf,
+    scoring_params
+)
+from metrics import STAGE_SECONDS, QUEUE_DEPTH, ATTEMPT_EMIT_SECONDS
+
 from logger import (
     INFO,
     SOCKET,
@@ -43,18 +54,26 @@ logger = Logger([
     INFO
 ])
 
-class ShotDetector:
+class ShotDetector(ScoringStateMachine):
     def __init__(self, 
                 video_path,             # Video path for processing
                 on_detect,              # on_detect(timestamp, success, team_id, shot_location) -> Callback to MatchHandler for when a shot is detected
                 on_complete,            # on_complete(team_id) -> Callback to MatchHandler for when video finishes processing
                 show_vid=False,         # Show CV2 window while processing, for debugging, will significantly slow down program
                 video_id=None,           # 1 or 2
+                checkpoint=None,        # VideoCheckpoint to periodically save progress to and resume from
+                start_frame=0,          # First frame to process
+                end_frame=None,         # Frame to stop at (exclusive), None for the end of the video
+                detection_log=None,     # DetectionLog to record every model detection to
+                follow_upload=None,     # follow_upload() -> True once the video is fully uploaded, reads the growing file until then
+                live=False,             # video_path is a live stream URL or pipe, frames are dropped when processing falls behind
+                profiler=None,          # SamplingProfiler to sample the pipeline threads with
                 **kwargs):
         
         #TODO: initialize with team_id, updated based on switch timestamp
-        self.model = YOLO(env['weights_path'], verbose=False)
-        self.model_shoot = YOLO(env['weights_path_shoot'], verbose=False)
+        # Models are loaded once per process and shared between detectors
+        self.model = registry.get(env['weights_path'])
+        self.model_shoot = registry.get(env['weights_path_shoot'])
         self.class_names = env['classes']
         self.class_names_shoot = env['classes_shoot']
         self.colors = [(0, 255, 0), (255, 255, 0), (255, 255, 255), (255, 0, 0), (0, 0, 255)]
@@ -70,15 +89,25 @@ class ShotDetector:
         os.makedirs(self.output_true_shot, exist_ok=True)
         os.makedirs(self.output_all_shot, exist_ok=True)
         
-        self.cap = cv2.VideoCapture(video_path)
-        self.frame_rate = self.cap.get(cv2.CAP_PROP_FPS)
-        logger.log(INFO, f"FPS: {self.frame_rate}")
-
-        self.ball_pos = []  # array of tuples ((x_pos, y_pos), frame count, width, height, conf)
-        self.hoop_pos = []  # array of tuples ((x_pos, y_pos), frame count, width, height, conf)
-        self.frame_track = [] # array of tuples (det_frame, timestamp)
-        self.num_frames_to_track = 2 * self.frame_rate # 2 seconds before
-        self.frame_count = 0
+        self.live = live
+        if live:
+            self.cap = LiveCapture(video_path, env.get('live_buffer_frames', 2))
+        elif follow_upload:
+            self.cap = TailFollowCapture(
+                video_path,
+                follow_upload,
+                env.get('tail_follow_poll_seconds', 1),
+                env.get('tail_follow_stall_seconds', 600)
+            )
+        else:
+            self.cap = cv2.VideoCapture(video_path)
+        frame_rate = self.cap.get(cv2.CAP_PROP_FPS)
+        logger.log(INFO, f"FPS: {frame_rate}")
+
+        # Tracking and attempt state, scoring parameters can be overridden in the config
+        super().__init__(frame_rate, scoring_params(env))
+
+        self.num_frames_to_track = int(2 * self.frame_rate) # 2 seconds before
         self.frame = None
 
         self.width = int(self.cap.get(3))
@@ -86,23 +115,13 @@ class ShotDetector:
 
         logger.log(INFO, f"Input Resolution: {self.width} X {self.height}")
 
-        self.makes = 0
-        self.attempts = 0
-        self.attempt_cooldown = 0
-        self.attempt_time = 0
-
-
         self.video_id = video_id
 
-        # For marking if the ball / rim have been detected in the current frame
-        self.ball_detected = False
-        self.rim_detected = False
         self.should_detect_shot = False
         # Used for green and red colors after make/miss
         self.fade_frames = 20
         self.fade_counter = 0
         self.overlay_color = (0, 0, 0)
-        self.last_point_in_region = None
         
         self.screen_shot_count = 0
         self.screenshot = env['screenshot']
@@ -120,14 +139,26 @@ class ShotDetector:
 
         logger.log(INFO, f"Inference Resolution: {self.inference_width} X {self.inference_height}")
 
-        self.attempt_cooldown = 0
-        self.timestamp = None
-        self.ball_entered = False
-        self.rim_last_detected = -1
+        # Ring buffer of the last 2 seconds of inference frames for shot localization,
+        # full resolution frames are only kept for debug output
+        self.keep_full_frames = env.get('debug_shot_frames', False)
+        self.frame_track = FrameRingBuffer(
+            self.num_frames_to_track,
+            (self.inference_height, self.inference_width, 3),
+            full_frame_shape=(self.height, self.width, 3) if self.keep_full_frames else None
+        )
 
-        self.MISS_ATTEMPT_COOLDOWN = int(self.frame_rate * 2.5)
-        self.MADE_ATTEMPT_COOLDOWN = int(self.frame_rate * 3)
-        self.ATTEMPT_DETECTION_INTERVAL = int(self.frame_rate * 0.3)
+        # Number of frames sent to the ball / rim model in a single call
+        self.inference_batch_size = max(1, int(env.get('inference_batch_size', 1)))
+
+        # Reduced inference rate during attempt cooldown, back to full rate shortly before it expires
+        self.cooldown_stride = max(1, int(env.get('cooldown_inference_stride', 1)))
+        self.cooldown_resume_frames = int(env.get('cooldown_resume_seconds', 0.5) * self.frame_rate)
+        self.cooldown_skipped_frames = 0
+
+        # Main model on every n-th frame only, the ball tracker predicts the frames in between
+        self.main_stride = max(1, int(env.get('main_inference_stride', 1)))
+        self.stride_skipped_frames = 0
 
         self.output_width = env['output_width']
         self.output_height = env['output_height']
@@ -139,17 +170,84 @@ class ShotDetector:
             logger.log(INFO, f"Saving results to: {output_name}")
             self.out = cv2.VideoWriter(output_name,  cv2.VideoWriter_fourcc(*'mp4v'), self.frame_rate, (self.output_width, self.output_height))
         
+        # Motion gate that lowers the inference rate while nothing happens near the rim
+        self.activity_gate = None
+        if env.get('activity_gate', False):
+            self.activity_gate = ActivityGate(
+                env.get('activity_gate_pixel_delta', 12),
+                env.get('activity_gate_min_changed', 0.002),
+                int(env.get('activity_gate_idle_seconds', 2) * self.frame_rate),
+                env.get('activity_gate_idle_stride', 10)
+            )
+        self.gate_region = None   # score region of the last known hoop, read by the decode stage
+
+        # Ball detection on a crop around the rim once the rim position is stable
+        self.hoop_roi = None
+        if env.get('hoop_roi', False):
+            self.hoop_roi = HoopROI(
+                env.get('hoop_roi_lock_frames', 30),
+                env.get('hoop_roi_max_jitter', 0.25),
+                env.get('hoop_roi_margin', 1.5),
+                env.get('hoop_roi_refresh_interval', 30),
+                self.region_multipliers
+            )
+        self.processed_frames = 0
+        self.inferred_frames = 0
+
+        # Pipeline components, decode -> inference -> scoring
+        queue_size = max(self.inference_batch_size, int(env.get('pipeline_queue_size', 32)))
+        if self.live:
+            # Frames waiting in the queues are latency on a live stream
+            queue_size = max(self.inference_batch_size, int(env.get('live_pipeline_queue_size', 8)))
+        self.decode_queue = Queue(maxsize=queue_size)
+        self.result_queue = Queue(maxsize=queue_size)
+        self.pipeline_stop = threading.Event()
+        self.decode_error = None
+        self.inference_error = None
+        self.stage_timings = StageTimings(lambda stage, seconds: STAGE_SECONDS.observe(seconds, stage=stage))
+        self.queue_depth_stats = {}
+        self.queue_depth_samples = 0
+        self.queue_depth_log_interval = env.get('queue_depth_log_interval', 0)
+
+        # Parsed shoot model results per (video_id, frame_count), shared by overlapping shot windows
+        self.shoot_cache = ResultCache(env.get('shoot_cache_size', 240))
+
+        # Shooter localization search, stride 1 and no limit infers every frame in the window
+        self.shoot_search_stride = max(1, int(env.get('shoot_search_stride', 1)))
+        self.shoot_search_max_inferences = env.get('shoot_search_max_inferences', 0)
+
         # Threading components
         self.detection_queue = Queue()
         # self.detection_thread = None
         self.detection_thread_active = True
         # self.detection_lock = threading.Lock()
+
+        # Attempts passed to on_detect so far, (timestamp, success, video_id, shot_location)
+        self.emitted_events = []
+        self.detection_log = detection_log
+        if self.detection_log is not None:
+            self.detection_log.set_video(self.frame_rate, self.width, self.height, self.class_names, self.params)
+        self.profiler = profiler
+
+        # Periodic checkpoints, processing resumes from the last one if it exists
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = int(env.get('checkpoint_interval_seconds', 60) * self.frame_rate)
+        self.start_frame = self.frame_count = self.last_checkpoint = start_frame
+        self.end_frame = end_frame
+        if self.start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        if self.checkpoint:
+            self.restore_checkpoint()
         
         # Start detection worker thread
         self.detection_thread = threading.Thread(target=self._detection_worker)
         self.detection_thread.daemon = True
         self.detection_thread.start()
 
+        if self.profiler:
+            self.profiler.watch(f"video{self.video_id}.scoring")
+            self.profiler.watch(f"video{self.video_id}.detection", self.detection_thread)
+
         start_time = time.time()
         self.run()
         
@@ -161,109 +259,416 @@ class ShotDetector:
         logger.log(INFO, f"Total processing time: {minutes:02d}:{seconds:02d}")
 
     def run(self):
+        # Decoding and inference run in their own threads, connected to the scoring
+        # stage (this thread) by bounded queues so that decoding of later frames
+        # overlaps inference and scoring of earlier ones
+        decode_thread = threading.Thread(target=self._decode_worker)
+        decode_thread.daemon = True
+        inference_thread = threading.Thread(target=self._inference_worker)
+        inference_thread.daemon = True
+
+        decode_thread.start()
+        inference_thread.start()
+
+        if self.profiler:
+            self.profiler.watch(f"video{self.video_id}.decode", decode_thread)
+            self.profiler.watch(f"video{self.video_id}.inference", inference_thread)
+
         while True:
-            ret, self.frame = self.cap.read()
+            item = self.result_queue.get()
 
-            if not ret:
-                logger.log(INFO, "Processing complete")
-                # Signal detection thread to stop
-                self.detection_thread_active = False
+            if item is None:
                 break
 
-            self.timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC)
-
-            # resize to match - force 1280 and 720 for better model results
-            det_frame = cv2.resize(self.frame, (self.inference_width, self.inference_height))
+            frame_data, r = item
+            self.sample_queue_depths()
 
-            results = self.model(det_frame, stream=True, verbose=False, imgsz=self.inference_width, device=env.get('device', 0))
+            if not self.process_frame(frame_data, r):
+                break
 
-            for r in results:
+        logger.log(INFO, "Processing complete")
+        logger.log(INFO, f"Queue depths (avg / max): {self.queue_depth_summary()}")
 
-                #TODO: better way to get max conf boxes only
-                boxes = sorted([(box.xyxy[0], box.conf, box.cls) for box in r.boxes], key=lambda x: -x[1])
-                #sort and get only top prediction for ball / hoop
+        # Stop the pipeline stages in case scoring stopped early
+        self.pipeline_stop.set()
+        decode_thread.join(timeout=5.0)
+        inference_thread.join(timeout=5.0)
 
-                # Reset detection variables
-                self.ball_detected, self.rim_detected = False, False
+        # Let the detection worker finish attempts still in the queue
+        self.detection_queue.join()
 
-                for box in boxes:
-                    # Only one ball / rim should be detected per frame
-                    if self.ball_detected and self.rim_detected:
-                        break
-                    
-                    # Bounding box
-                    x1, y1, x2, y2 = box[0]
+        # Signal detection thread to stop
+        self.detection_thread_active = False
 
-                    # Scale back up to original dimensions
-                    x1, y1, x2, y2 = int(x1 * self.width/self.inference_width), int(y1 * self.height/self.inference_height), int(x2 * self.width/self.inference_width), int(y2* self.height/self.inference_height)
-                    w, h = x2 - x1, y2 - y1
+        # Wait for detection thread to finish
+        if self.detection_thread and self.detection_thread.is_alive():
+            self.detection_thread.join(timeout=5.0)
+            
+        logger.log(INFO, f"Shoot model cache: {self.shoot_cache.stats()}")
 
-                    # Confidence
-                    conf = math.ceil((box[1] * 100)) / 100
+        # A failed stage is not the end of the video, fail the run instead of completing it
+        # with a truncated report (a stalled upload fails too, so the run can be resumed)
+        error = self.decode_error or self.inference_error
+        if error:
+            self.cap.release()
+            if self.save:
+                self.out.release()
+            raise error
 
-                    # Class Name
-                    cls = int(box[2])
-                    current_class = self.class_names[cls]
-                    # print(cls, current_class)
+        self.run_report = self.build_report()
+        logger.log(INFO, f"Run report: {self.run_report}")
 
-                    center = (int(x1 + w / 2), int(y1 + h / 2))
+        self.on_complete(self.run_report)
+        
+        self.cap.release()
+        
+        if self.save:
+            self.out.release()
+        if self.show_vid:
+            cv2.destroyAllWindows()
 
-                    if (conf > 0.7 and current_class == 'rim' and not self.rim_detected) or (conf > 0.7 and current_class == 'ball' and not self.ball_detected):
+    # Puts an item on a pipeline queue, giving up if the pipeline is stopped
+    def _pipeline_put(self, queue, item):
+        while not self.pipeline_stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
 
-                        if self.show_vid or self.save or self.screenshot:
-                            self.draw_bounding_box(current_class, conf, cls, x1, y1, x2, y2)
-                        
-                        if current_class == 'rim':
-                            self.rim_detected = True
-                            self.rim_last_detected = self.frame_count
-                            self.hoop_pos.append((center, self.frame_count, w, h, conf))
-                        elif current_class == 'ball':
-                            self.ball_detected = True
-                            self.ball_pos.append((center, self.frame_count, w, h, conf))
-  
-            # Store frame boxes info instead of frame
-            if len(self.frame_track) >= self.num_frames_to_track:
-                self.frame_track.pop(0)
-            self.frame_track.append((det_frame,self.frame_count, self.timestamp, self.frame))
+    # Gets an item from a pipeline queue, returns None if the pipeline is stopped
+    def _pipeline_get(self, queue):
+        while not self.pipeline_stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return None
 
+    def _decode_worker(self):
+        """Pipeline stage that reads and resizes frames from the video."""
+        try:
+            frame_count = self.start_frame
+            while not self.pipeline_stop.is_set():
+                if self.end_frame is not None and frame_count >= self.end_frame:
+                    break
+
+                with self.stage_timings.measure('decode'):
+                    ret, frame = self.cap.read()
+
+                if not ret:
+                    break
+
+                # Skip the frame indices of frames a live source dropped
+                if self.live:
+                    frame_count = self.cap.frame_index
+
+                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+                # resize to match - force 1280 and 720 for better model results
+                with self.stage_timings.measure('resize'):
+                    det_frame = cv2.resize(frame, (self.inference_width, self.inference_height))
+
+                frame_data = {
+                    'frame': frame,
+                    'det_frame': det_frame,
+                    'timestamp': timestamp,
+                    'frame_count': frame_count,
+                    'infer': self._should_infer(frame_count, timestamp, frame),
+                    # Window (x1, y1, x2, y2) of the full frame to infer on, None for the whole frame,
+                    # set by the inference stage
+                    'roi': None
+                }
+                if not self._pipeline_put(self.decode_queue, frame_data):
+                    break
+                frame_count += 1
+        except Exception as e:
+            logger.log(INFO, f"Error in decode stage: {str(e)}")
+            self.decode_error = e
+        finally:
+            self._pipeline_put(self.decode_queue, None)
+
+    def _inference_worker(self):
+        """Pipeline stage that runs the ball / rim model on batches of decoded frames."""
+        try:
+            finished = False
+            while not finished and not self.pipeline_stop.is_set():
+                batch = []
+                while len(batch) < self.inference_batch_size:
+                    frame_data = self._pipeline_get(self.decode_queue)
+                    if frame_data is None:
+                        finished = True
+                        break
+                    batch.append(frame_data)
+
+                if not batch:
+                    break
+
+                # Cooldown only starts once scoring reaches the attempt, by then the decode
+                # stage is far ahead, so it is applied to frames not sent to the model yet
+                for frame_data in batch:
+                    if frame_data['infer'] and self._cooldown_skip(frame_data['frame_count']):
+                        frame_data['infer'] = False
+                    if frame_data['infer'] and self.hoop_roi:
+                        frame_data['roi'] = self.hoop_roi.crop_window(frame_data['frame_count'])
+
+                # Frames skipped by _should_infer are passed on without a result,
+                # frames with a hoop ROI are inferred on the crop, grouped by window
+                groups = {}
+                for i, frame_data in enumerate(batch):
+                    if frame_data['infer']:
+                        groups.setdefault(frame_data['roi'], []).append(i)
+
+                results = {}
+                for roi, indices in groups.items():
+                    if roi is None:
+                        inputs = [batch[i]['det_frame'] for i in indices]
+                        imgsz = self.inference_width
+                    else:
+                        x1, y1, x2, y2 = roi
+                        inputs = [batch[i]['frame'][y1:y2, x1:x2] for i in indices]
+                        imgsz = max(x2 - x1, y2 - y1)
+
+                    with self.stage_timings.measure('inference'):
+                        group_results = self.model(inputs, stream=True, verbose=False, imgsz=imgsz, device=env.get('device', 0))
+                    for i, r in zip(indices, group_results):
+                        results[i] = r
+
+                for i, frame_data in enumerate(batch):
+                    if not self._pipeline_put(self.result_queue, (frame_data, results.get(i))):
+                        return
+        except Exception as e:
+            logger.log(INFO, f"Error in inference stage: {str(e)}")
+            self.inference_error = e
+        finally:
+            self._pipeline_put(self.result_queue, None)
+
+    # Decides in the decode stage whether a frame is sent to the ball / rim model
+    def _should_infer(self, frame_count, timestamp, frame):
+        if frame_count % self.main_stride != 0:
+            self.stride_skipped_frames += 1
+            return False
+
+        if self.activity_gate and not self.activity_gate.should_infer(frame_count, timestamp, frame, self.gate_region):
+            return False
+        return True
+
+    # Decides in the inference stage whether a frame is skipped for the attempt cooldown
+    def _cooldown_skip(self, frame_count):
+        # Only keep hoop / ball positions warm while no attempt can be registered
+        if frame_count < self.cooldown_until - self.cooldown_resume_frames and frame_count % self.cooldown_stride != 0:
+            self.cooldown_skipped_frames += 1
+            return True
+        return False
+
+    def save_checkpoint(self):
+        """Persist the state needed to resume processing from the current frame"""
+        self.checkpoint.save({
+            'frame_count': self.frame_count,
+            'timestamp': self.timestamp,
+            'ball_pos': self.ball_pos.to_list(),
+            'hoop_pos': self.hoop_pos.to_list(),
+            'last_point_in_region': self.last_point_in_region,
+            'attempt_cooldown': self.attempt_cooldown,
+            'cooldown_until': self.cooldown_until,
+            'rim_last_detected': self.rim_last_detected,
+            'ball_entered': self.ball_entered,
+            'attempt_time': self.attempt_time,
+            'makes': self.makes,
+            'attempts': self.attempts,
+            'processed_frames': self.processed_frames,
+            'inferred_frames': self.inferred_frames,
+            'cooldown_skipped_frames': self.cooldown_skipped_frames,
+            'events': list(self.emitted_events)
+        })
+        self.last_checkpoint = self.frame_count
+        logger.log(INFO, f"Checkpoint saved at frame {self.frame_count} [{get_time_string(self.timestamp)}]")
+
+    def restore_checkpoint(self):
+        """Resume from the last checkpoint if there is one, re-emitting its attempts"""
+        state = self.checkpoint.load()
+        if not state:
+            return
+
+        def to_entry(entry):
+            return (tuple(entry[0]), entry[1], entry[2], entry[3], entry[4])
+
+        self.ball_pos = Trajectory.from_list(BALL_TRAJECTORY_CAPACITY, state['ball_pos'])
+        self.hoop_pos = Trajectory.from_list(HOOP_TRAJECTORY_CAPACITY, state['hoop_pos'])
+        self.last_point_in_region = to_entry(state['last_point_in_region']) if state['last_point_in_region'] else None
+        self.attempt_cooldown = state['attempt_cooldown']
+        self.cooldown_until = state['cooldown_until']
+        self.rim_last_detected = state['rim_last_detected']
+        self.ball_entered = state['ball_entered']
+        self.attempt_time = state['attempt_time']
+        self.makes = state['makes']
+        self.attempts = state['attempts']
+        self.processed_frames = state['processed_frames']
+        self.inferred_frames = state['inferred_frames']
+        self.cooldown_skipped_frames = state['cooldown_skipped_frames']
+        self.timestamp = state['timestamp']
+
+        self.frame_count = self.start_frame = self.last_checkpoint = state['frame_count']
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+
+        for timestamp, success, video_id, shot_location in state['events']:
+            self.on_detect(timestamp, success, video_id, tuple(shot_location))
+            self.emitted_events.append((timestamp, success, video_id, tuple(shot_location)))
+
+        logger.log(INFO, f"Resuming from frame {self.start_frame} [{get_time_string(self.timestamp)}] with {len(state['events'])} attempts")
+
+    def build_report(self):
+        """Summary of the run, saved with the match results"""
+        report = {
+            'frames': self.processed_frames,
+            'inferred_frames': self.inferred_frames,
+            'makes': self.makes,
+            'attempts': self.attempts,
+            'cooldown_skipped_frames': self.cooldown_skipped_frames
+        }
+        if self.main_stride > 1:
+            report['stride_skipped_frames'] = self.stride_skipped_frames
+        if self.activity_gate:
+            report['activity_gate'] = self.activity_gate.report()
+        if self.hoop_roi:
+            report['roi_frames'] = self.hoop_roi.roi_frames
+        if self.live:
+            report['dropped_frames'] = self.cap.dropped_frames
+        report['stage_timings'] = self.stage_timings.report()
+        return report
+
+    def queue_depths(self):
+        """Current number of items waiting in front of each pipeline stage."""
+        return {
+            'inference': self.decode_queue.qsize(),
+            'scoring': self.result_queue.qsize(),
+            'detection': self.detection_queue.qsize()
+        }
+
+    def sample_queue_depths(self):
+        depths = self.queue_depths()
+        for stage, depth in depths.items():
+            QUEUE_DEPTH.observe(depth, queue=stage)
+            stats = self.queue_depth_stats.setdefault(stage, {'total': 0, 'max': 0})
+            stats['total'] += depth
+            stats['max'] = max(stats['max'], depth)
+        self.queue_depth_samples += 1
+
+        if self.queue_depth_log_interval and self.queue_depth_samples % self.queue_depth_log_interval == 0:
+            logger.log(INFO, f"Queue depths: {depths}")
+
+    def queue_depth_summary(self):
+        """Average and maximum queue depth per stage over the run."""
+        samples = max(1, self.queue_depth_samples)
+        return {
+            stage: (round(stats['total'] / samples, 2), stats['max'])
+            for stage, stats in self.queue_depth_stats.items()
+        }
+
+    # Runs tracking, scoring and drawing for a single decoded frame and its inference result
+    # Returns False if processing should stop
+    def process_frame(self, frame_data, result):
+        self.frame = frame_data['frame']
+        det_frame = frame_data['det_frame']
+
+        # Live sources drop frames when behind, frame_count skips ahead then
+        self.begin_frame(frame_data['frame_count'], frame_data['timestamp'])
+
+        with self.stage_timings.measure('postprocess'):
+            self.update_positions(result, frame_data['roi'])
+            # Fills frames the main model skipped or missed the ball in
+            self.predict_ball()
+        self.processed_frames += 1
+        if self.detection_log is not None:
+            self.detection_log.add_frame(self.frame_count, self.timestamp, result is not None)
+        if result is not None:
+            self.inferred_frames += 1
+
+        # Store frame for shot localization
+        self.frame_track.push(det_frame, self.frame_count, self.timestamp, self.frame if self.keep_full_frames else None)
+
+        with self.stage_timings.measure('clean_motion'):
             self.clean_motion()
+        with self.stage_timings.measure('score_detection'):
             self.score_detection()
+
+        # Published for the activity gate in the decode stage
+        self.gate_region = self.score_region()
+
+        if self.hoop_roi and result is not None:
+            rim_found = self.rim_detected and self.hoop_pos and self.hoop_pos[-1][1] == self.frame_count
+            self.hoop_roi.update(self.hoop_pos[-1] if rim_found else None, self.width, self.height)
+        
+        self.finish_frame()
+
+        # Only checkpoint while no attempt is waiting for localization, so every attempt
+        # up to this frame has been emitted and is part of the checkpoint
+        if self.checkpoint and self.frame_count - self.last_checkpoint >= self.checkpoint_interval and self.detection_queue.unfinished_tasks == 0:
+            self.save_checkpoint()
+
+        if self.show_vid or self.save or self.screenshot:
+            self.draw_overlay()
+            # self.draw_overlay()
+
+            if self.show_vid:
+                cv2.imshow('Frame', self.frame)
+                # Close if 'q' is clicked
+                if cv2.waitKey(1) & 0xFF == ord('q'):  # higher waitKey slows video down, use 1 for webcam
+                    return False
+
+            if self.screen_shot_moment:
+                cv2.imwrite(f"{self.screen_shot_path}/{self.screen_shot_count}.png", self.frame)
+                self.screen_shot_moment = False
+                self.screen_shot_count += 1
+
+            if self.save:
+                self.out.write(cv2.resize(self.frame, (env['output_width'], env['output_height'])))
+
+        return True
+
+    # Function to update ball and rim positions from a model result, None if the frame was not inferred
+    # roi is the (x1, y1, x2, y2) window of the full frame the model was run on, None for the whole frame
+    def update_positions(self, r, roi=None):
+        if r is None:
+            return
+
+        #TODO: better way to get max conf boxes only
+        boxes = sorted([(box.xyxy[0], box.conf, box.cls) for box in r.boxes], key=lambda x: -x[1])
+        #sort and get only top prediction for ball / hoop
+
+        if self.detection_log is not None:
+            for xyxy, conf, cls in boxes:
+                self.detection_log.add_box(MAIN_MODEL, self.frame_count, int(cls), float(conf), self.to_frame_coords(xyxy, roi))
+
+        for box in boxes:
+            # Only one ball / rim should be detected per frame
+            if self.ball_detected and self.rim_detected:
+                break
             
-            self.frame_count += 1
+            # Bounding box
+            x1, y1, x2, y2 = self.to_frame_coords(box[0], roi)
 
-            if self.attempt_cooldown > 0:
-                self.attempt_cooldown -= 1
+            # Confidence
+            conf = round_conf(box[1])
 
-            if self.show_vid or self.save or self.screenshot:
-                self.draw_overlay()
-                # self.draw_overlay()
+            # Class Name
+            cls = int(box[2])
+            current_class = self.class_names[cls]
 
-                if self.show_vid:
-                    cv2.imshow('Frame', self.frame)
-                    # Close if 'q' is clicked
-                    if cv2.waitKey(1) & 0xFF == ord('q'):  # higher waitKey slows video down, use 1 for webcam
-                        break
+            if self.add_box(current_class, (x1, y1, x2, y2), conf):
+                if self.show_vid or self.save or self.screenshot:
+                    self.draw_bounding_box(current_class, conf, cls, x1, y1, x2, y2)
 
-                if self.screen_shot_moment:
-                    cv2.imwrite(f"{self.screen_shot_path}/{self.screen_shot_count}.png", self.frame)
-                    self.screen_shot_moment = False
-                    self.screen_shot_count += 1
+    def to_frame_coords(self, xyxy, roi=None):
+        """Box from the inference frame, or the roi crop it was inferred on, in full frame pixels"""
+        x1, y1, x2, y2 = xyxy
 
-                if self.save:
-                    self.out.write(cv2.resize(self.frame, (env['output_width'], env['output_height'])))
-        
-        # Wait for detection thread to finish
-        if self.detection_thread and self.detection_thread.is_alive():
-            self.detection_thread.join(timeout=5.0)
-            
-        self.on_complete()
-        
-        self.cap.release()
-        
-        if self.save:
-            self.out.release()
-        if self.show_vid:
-            cv2.destroyAllWindows()
+        if roi is None:
+            # Scale back up to original dimensions
+            return int(x1 * self.width/self.inference_width), int(y1 * self.height/self.inference_height), int(x2 * self.width/self.inference_width), int(y2* self.height/self.inference_height)
+
+        # Offset from the crop back to the full frame
+        return int(x1) + roi[0], int(y1) + roi[1], int(x2) + roi[0], int(y2) + roi[1]
 
     # Function to draw bounding box for ball and rim
     def draw_bounding_box(self, current_class, conf, cls, x1, y1, x2, y2):
@@ -309,136 +714,36 @@ class ShotDetector:
         cv2.putText(self.frame, timestring, (int(self.width*0.9), 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 4)
 
         #display ball trajectory
-        for i in range(0, len(self.ball_pos)):
-            color = (0, 0, 255) if i == len(self.ball_pos)-1 else (100, 100, 100, 0.5)
-            thickness = 5 if i == len(self.ball_pos)-1 else 2
+        centers = self.ball_pos.array()[:, :2].astype(int).tolist()
+        for i, center in enumerate(centers):
+            color = (0, 0, 255) if i == len(centers)-1 else (100, 100, 100, 0.5)
+            thickness = 5 if i == len(centers)-1 else 2
                 
-            cv2.circle(self.frame, self.ball_pos[i][0], 2, color, thickness)
+            cv2.circle(self.frame, tuple(center), 2, color, thickness)
 
         self.display_score()
 
 
-    # Function to clean likely erroneous detections
-    def clean_motion(self):
-        # Clean and display ball motion
-        self.ball_pos = clean_ball_pos(self.ball_pos, self.frame_count)
-        
-        # Clean hoop motion and display current hoop center
-        if len(self.hoop_pos) > 1:
-            self.hoop_pos = clean_hoop_pos(self.hoop_pos)
-
-    # Function to handle scoring moment detection logic
-    def score_detection(self):
-        #only execute if hoop and ball pos is known
-        if len(self.hoop_pos) > 0 and len(self.ball_pos) > 0:
-            
-            # Made: Enters hoop region, shortly after enters down region, 
-            # Attempt: Enters up region, then exits up region without entering hoop region
-            
-            if self.frame_count - self.rim_last_detected < self.frame_rate and self.ball_detected and self.attempt_cooldown == 0:
-                if in_score_region(self.ball_pos, self.hoop_pos):
-                    if self.ball_entered:
-                        self.attempt_time += 1
-                    else:
-                        self.ball_entered = True
-                        self.attempt_time = 1
-                    
+    # Queue an attempt detected by score_detection for shot localization
+    def on_attempt(self, scored):
+        if scored:
+            self.overlay_color = (0, 255, 0)
+        else:
+            self.overlay_color = (0, 0, 255)
+        self.fade_counter = self.fade_frames
 
-                    #Add linear interpolation
-                    if not self.last_point_in_region:
-                        self.last_point_in_region = self.ball_pos[-1]
-                        scored = False
-                    else: 
-                        scored = detect_score(self.ball_pos, self.hoop_pos, self.last_point_in_region)
-
-                    # self.attempts += 1
-                    # self.frame = cv2.putText(self.frame, 'DOWN', (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    if scored:
-                        # print(self.ball_pos[-1], self.last_point_in_region, self.hoop_pos[-1])
-                        # time_string = get_time_string(self.timestamp)
-                        self.makes += 1
-                        self.attempts += 1
-                        
-                        # Create detection task dictionary with current state
-                        detection_task = {
-                            'frame_track': copy(self.frame_track),
-                            'timestamp': self.timestamp,
-                            'is_scored': True,
-                            'video_id': self.video_id
-                        }
-                        self.detection_queue.put(detection_task)
-                        
-                        # shot_location, shot_timestamp = self.shot_detection()
-                        
-                        # if shot_location:
-                        #     scaled_shot_location = (shot_location[0] / self.width, shot_location[1] / self.height)
-                        # else:
-                        #     scaled_shot_location = (None, None)
-                        
-                        # if shot_timestamp:
-                        #     logger.log(INFO, f"Shot detected at {shot_timestamp}  |  Location: {shot_location}")
-                        # self.on_detect(self.timestamp, True, self.video_id, scaled_shot_location)
-                        # move shoot detection here
-                        # self.should_detect_shot = True
-
-                        logger.log(INFO, f"[{get_time_string(detection_task['timestamp'])}] {'Shot made'.ljust(13)}")
-                    # else:
-                    #     self.detect_callback(max(0, self.timestamp-3000), self.timestamp+2000, False)
-                    #     print("attempt made")
-                        self.overlay_color = (0, 255, 0)
-                        self.fade_counter = self.fade_frames
-                        self.attempt_cooldown = self.MADE_ATTEMPT_COOLDOWN
-                        self.screen_shot_moment = True
-                        self.last_point_in_region = None
-                        self.ball_entered = False
-                        self.attempt_time = 0
-                    
-                    else:
-                        self.last_point_in_region = self.ball_pos[-1]
-                
+        # Create detection task dictionary with current state
+        detection_task = {
+            'frame_track': self.frame_track.snapshot(),
+            'timestamp': self.timestamp,
+            'is_scored': scored,
+            'video_id': self.video_id,
+            'detected_at': time.perf_counter()
+        }
+        self.detection_queue.put(detection_task)
 
-                else:
-                    if self.ball_entered:
-                        self.attempt_time += 1
-
-                    if self.attempt_time >= self.ATTEMPT_DETECTION_INTERVAL:
-                        time_string = get_time_string(self.timestamp)
-                        self.overlay_color = (0, 0, 255)
-                        self.fade_counter = self.fade_frames
-
-                        # Create detection task dictionary with current state
-                        detection_task = {
-                            'frame_track': copy(self.frame_track),
-                            'timestamp': self.timestamp,
-                            'is_scored': False,
-                            'video_id': self.video_id
-                        }
-                        self.detection_queue.put(detection_task)
-
-                        # on_detect(timestamp, success, video_id, shot_location)
-                        # shot_location, shot_timestamp = self.shot_detection()
-                        # if shot_location:
-                        #     scaled_shot_location = (shot_location[0] / self.width, shot_location[1] / self.height)
-                        # else:
-                        #     scaled_shot_location = (None, None)
-                        
-                        # if shot_timestamp:
-                        #     #TODO: logic for shot localization
-                        #     logger.log(INFO, f"Shot detected at {shot_timestamp}  |  Location: {shot_location}")
-
-                        # self.on_detect(self.timestamp, False, self.video_id, scaled_shot_location)
-                        # move shoot detection here
-                        # self.should_detect_shot = True
-                        logger.log(INFO, f"[{get_time_string(detection_task['timestamp'])}] {'Attempt made'.ljust(13)}")
-                        self.attempts += 1
-                        
-                        self.attempt_cooldown = self.MISS_ATTEMPT_COOLDOWN
-                        self.screen_shot_moment = True
-                        
-                        self.attempt_time = 0
-                        self.ball_entered = False
-                        self.last_point_in_region = None
-    
+        logger.log(INFO, f"[{get_time_string(detection_task['timestamp'])}] {('Shot made' if scored else 'Attempt made').ljust(13)}")
+        self.screen_shot_moment = True
 
     def display_score(self):
         # Add text
@@ -462,11 +767,13 @@ class ShotDetector:
     def _detection_worker(self):
         """Background thread that processes shot detection tasks."""
         while self.detection_thread_active:
+            task = None
             try:
                 # Get detection task dictionary from queue
                 task = self.detection_queue.get(timeout=1.0)
                 # Process the detection
-                shot_location, shot_timestamp = self._process_shot_detection(task['frame_track'])
+                with self.stage_timings.measure('shoot_localization'):
+                    shot_location, shot_timestamp = self._process_shot_detection(task['frame_track'])
                 # Scale shot location if found
                 if shot_location and shot_timestamp:
                     scaled_shot_location = (shot_location[0] / self.width, shot_location[1] / self.height)
@@ -481,6 +788,8 @@ class ShotDetector:
 
                 # Call on_detect with preserved state
                 self.on_detect(task['timestamp'], task['is_scored'], task['video_id'], scaled_shot_location)
+                ATTEMPT_EMIT_SECONDS.observe(time.perf_counter() - task['detected_at'])
+                self.emitted_events.append((task['timestamp'], task['is_scored'], task['video_id'], scaled_shot_location))
 
             except Empty:
                 # Queue timeout - continue waiting
@@ -488,10 +797,118 @@ class ShotDetector:
             except Exception as e:
                 logger.log(INFO, f"Error in detection worker: {str(e)}")
                 continue
+            finally:
+                if task:
+                    task['frame_track'].release()
+                    self.detection_queue.task_done()
+
+    def _detect_shoot_boxes(self, frame_det_img, frame_count):
+        """
+        Run the shoot model on a single frame, returns (shoot_box, person_boxes).
+        Results are cached per frame so overlapping shot windows only infer each frame once.
+        """
+        cache_key = (self.video_id, frame_count)
+        cached = self.shoot_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # frame_det_img is already being resized to match - force 1280 and 720 for better model results
+        shoot_box = None
+        person_boxes = []
+        # Apply shoot detection model
+        with self.stage_timings.measure('shoot_inference'):
+            results = self.model_shoot(frame_det_img, stream=True, verbose=False, imgsz=self.inference_width, device=env.get('device', 0))
+
+        for r in results:
+            boxes = sorted([(box.xyxy[0], box.conf, box.cls) for box in r.boxes], key=lambda x: -x[1])
+            #sort and get only top prediction for ball / hoop
+            
+            # Define confidence thresholds for each class
+            conf_thresholds = {
+                'rim': 0.5,
+                'ball': 0.5,
+                'shoot': 0.65,
+                'person': 0.5
+            }
+            for box in boxes:
+                # Bounding box
+                x1, y1, x2, y2 = self.to_frame_coords(box[0])
+                w, h = x2 - x1, y2 - y1
+
+                if self.detection_log is not None:
+                    self.detection_log.add_box(SHOOT_MODEL, frame_count, int(box[2]), float(box[1]), (x1, y1, x2, y2))
+                center = (int(x1 + w / 2), int(y1 + h / 2))
+
+                # Confidence
+                conf = math.ceil((box[1] * 100)) / 100
+
+                # Class Name
+                cls = int(box[2])
+                current_class = self.class_names_shoot[cls]
+                # Store box info based on class and confidence threshold
+                if conf > conf_thresholds[current_class]:
+                    box_info = {
+                        'center': center,
+                        'width': w,
+                        'height': h,
+                        'confidence': conf,
+                        'coords': (x1, y1, x2, y2)
+                    }
+
+                    if current_class == 'shoot' and not shoot_box:
+                        # print("shoot detected, being processed...")
+                        shoot_box = box_info
+                        # Save annotated frame as image if shoot detected for debugging
+                        annotated_frame = r.plot()
+                        frame_filename = os.path.join(self.output_all_shot, f"all_shot_{self.frame_count}_{get_time_string(self.timestamp)}.jpg")
+                        cv2.imwrite(frame_filename, annotated_frame)
+                        # logger.log(INFO, f"shoot box recorded? {shoot_box} at {get_time_string(self.timestamp)}")
+                    
+                    elif current_class == 'person':
+                        person_boxes.append(box_info)
+
+        self.shoot_cache.put(cache_key, (shoot_box, person_boxes))
+        return shoot_box, person_boxes
+
+    def _search_shoot_frames(self, frame_track):
+        """
+        Coarse-to-fine search for frames with the "shoot" class.
+        Every shoot_search_stride-th frame is inferred first, then only the frames around
+        coarse hits are filled in, until shoot_search_max_inferences model calls are used.
+        Returns {index: (shoot_box, person_boxes, frame_count, timestamp, frame_img)}.
+        """
+        detections = {}
+        inferences = 0
+
+        def evaluate(i):
+            nonlocal inferences
+            if i in detections or not 0 <= i < len(frame_track):
+                return
+            if self.shoot_search_max_inferences and inferences >= self.shoot_search_max_inferences:
+                return
+
+            frame_det_img, frame_count, timestamp, frame_img = frame_track[i]
+            if (self.video_id, frame_count) not in self.shoot_cache:
+                inferences += 1
+            shoot_box, person_boxes = self._detect_shoot_boxes(frame_det_img, frame_count)
+            detections[i] = (shoot_box, person_boxes, frame_count, timestamp, frame_img)
+
+        # Coarse pass
+        for i in range(0, len(frame_track), self.shoot_search_stride):
+            evaluate(i)
+
+        # Fine pass, closest neighbours of coarse hits first
+        hits = [i for i, detection in detections.items() if detection[0]]
+        for offset in range(1, self.shoot_search_stride):
+            for i in hits:
+                evaluate(i - offset)
+                evaluate(i + offset)
+
+        return detections
 
     def _process_shot_detection(self, frame_track):
         """
-        Process shot detection on a snapshot of frame_track.
+        Process shot detection on a FrameSnapshot of frame_track.
         This is the same as the original shot_detection method but works on passed data.
         """
         shot_location = None
@@ -502,61 +919,10 @@ class ShotDetector:
         
         
         # Step 1: Find frames with "shoot" class
-        for frame_data in frame_track:
-            frame_det_img, frame_count, timestamp, frame_img = frame_data
-            # frame_det_img is already being resized to match - force 1280 and 720 for better model results
-            shoot_box = None
-            person_boxes = []
-            # Apply shoot detection model
-            results = self.model_shoot(frame_det_img, stream=True, verbose=False, imgsz=self.inference_width, device=env.get('device', 0))
+        detections = self._search_shoot_frames(frame_track)
 
-            for r in results:
-                boxes = sorted([(box.xyxy[0], box.conf, box.cls) for box in r.boxes], key=lambda x: -x[1])
-                #sort and get only top prediction for ball / hoop
-                
-                # Define confidence thresholds for each class
-                conf_thresholds = {
-                    'rim': 0.5,
-                    'ball': 0.5,
-                    'shoot': 0.65,
-                    'person': 0.5
-                }
-                for box in boxes:
-                    # Bounding box
-                    x1, y1, x2, y2 = box[0]
-
-                    # Scale back up to original dimensions
-                    x1, y1, x2, y2 = int(x1 * self.width/self.inference_width), int(y1 * self.height/self.inference_height), int(x2 * self.width/self.inference_width), int(y2* self.height/self.inference_height)
-                    w, h = x2 - x1, y2 - y1
-                    center = (int(x1 + w / 2), int(y1 + h / 2))
-
-                    # Confidence
-                    conf = math.ceil((box[1] * 100)) / 100
-
-                    # Class Name
-                    cls = int(box[2])
-                    current_class = self.class_names_shoot[cls]
-                    # Store box info based on class and confidence threshold
-                    if conf > conf_thresholds[current_class]:
-                        box_info = {
-                            'center': center,
-                            'width': w,
-                            'height': h,
-                            'confidence': conf,
-                            'coords': (x1, y1, x2, y2)
-                        }
-
-                        if current_class == 'shoot' and not shoot_box:
-                            # print("shoot detected, being processed...")
-                            shoot_box = box_info
-                            # Save annotated frame as image if shoot detected for debugging
-                            annotated_frame = r.plot()
-                            frame_filename = os.path.join(self.output_all_shot, f"all_shot_{self.frame_count}_{get_time_string(self.timestamp)}.jpg")
-                            cv2.imwrite(frame_filename, annotated_frame)
-                            # logger.log(INFO, f"shoot box recorded? {shoot_box} at {get_time_string(self.timestamp)}")
-                        
-                        elif current_class == 'person':
-                            person_boxes.append(box_info)                        
+        for i in sorted(detections):
+            shoot_box, person_boxes, frame_count, timestamp, frame_img = detections[i]
             # if shoot_box:
             #     logger.log(INFO, f"hv shoot box? {shoot_box and 1}")
             if shoot_box and person_boxes:
@@ -666,10 +1032,20 @@ if __name__ == "__main__":
         print(f"Attempts: {attempts}")
         print(f"Success rate: {success_rate:.2f}%")
         
-    def dummy_on_complete():
+    def dummy_on_complete(report=None):
         return 0
 
-    ShotDetector(env['input'], lambda x,y,z,k: 0, dummy_on_complete, False)
+    def print_detection(timestamp, success, video_id, shot_location):
+        print(f"[{get_time_string(timestamp)}] {'Made' if success else 'Missed'} shot, location: {shot_location}")
+
+    # e.g. --live rtsp://localhost:8554/court, or a named pipe fed by
+    # ffmpeg -re -i game.mp4 -f mpegts /tmp/court.fifo
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=env['input'], help="video file, or stream URL / pipe with --live")
+    parser.add_argument('--live', action='store_true', help="read the input as a live stream")
+    args = parser.parse_args()
+
+    ShotDetector(args.input, print_detection, dummy_on_complete, False, live=args.live)
 
 
 
@@ -4,20 +4,12 @@ import numpy as np
 import cv2
 
 from constants import (
-    MAP_WIDTH,
-    MAP_HEIGHT,
-    BASKET_X,
-    BASKET_Y,
-    PENALTY_BOX_X1,
-    PENALTY_BOX_X2,
-    PENALTY_BOX_Y1,
-    PENALTY_BOX_Y2,
-    THREE_PT_LEFT,
-    THREE_PT_RIGHT,
-    THREE_PT_RADIUS,
-    WING_ZONE_Y,
     NUM_ZONES,
 )
+from zone_index import (
+    ZONE_INDEX,
+    NO_ZONE
+)
 
 from logger import (
     INFO,
@@ -58,34 +50,22 @@ class TeamStatistics:
 
         return shot
 
-    def determine_zone(self, x, y):
-        if not x or not y:
-            return None
-        
-        if not (0 < x < MAP_WIDTH and 0 < y < MAP_HEIGHT):
-            return None
-        
-        zone = None
-        distance = np.sqrt((x - BASKET_X) ** 2 + (y - BASKET_Y) ** 2)
-        
-        is_three_pt = x < THREE_PT_LEFT or x > THREE_PT_RIGHT or distance > THREE_PT_RADIUS
-        column = 1 if x < PENALTY_BOX_X1 else 2 if x < PENALTY_BOX_X2 else 3
+    def add_shots(self, timestamps, successes, xs, ys):
+        """Add many shots at once, e.g. re-aggregating stored shots, zones are looked up in one call"""
+        zones = ZONE_INDEX.lookup(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)).tolist()
 
-        if not is_three_pt:
-            if y > PENALTY_BOX_Y2:
-                zone = 4
-            else:
-                zone = column
-        else:
-            if y < WING_ZONE_Y:
-                if x < THREE_PT_LEFT:
-                    zone = 8
-                elif x > THREE_PT_RIGHT:
-                    zone = 9
-            else:
-                zone = column + 4
+        shots = [
+            Shot(timestamp, success, x, y, self.determine_quarter(timestamp), zone if zone != NO_ZONE else None)
+            for timestamp, success, x, y, zone in zip(timestamps, successes, xs, ys, zones)
+        ]
+
+        logger.log(INFO, f"Added {len(shots)} shots")
+        self.shots.extend(shots)
 
-        return zone
+        return shots
+
+    def determine_zone(self, x, y):
+        return ZONE_INDEX.zone(x, y)
 
     def determine_is_three_pt(self, zone):
         return zone not in [1, 2, 3, 4]  # Zones 1-4 are not three-point shots
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules import each other by name and read config.yaml from the working
+# directory on import, like when the server is started from score_detection
+SCORE_DETECTION = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCORE_DETECTION)
+os.chdir(SCORE_DETECTION)
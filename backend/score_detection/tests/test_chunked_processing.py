@@ -0,0 +1,50 @@
+from chunked_processing import plan_chunks, merge_chunk_events
+
+
+def test_plan_chunks_overlap_and_open_end():
+    chunks = plan_chunks(900, 30, 3, 2)
+
+    assert [chunk['core_start_frame'] for chunk in chunks] == [0, 300, 600]
+    assert [chunk['start_frame'] for chunk in chunks] == [0, 240, 540]
+    assert [chunk['end_frame'] for chunk in chunks] == [300, 600, None]
+    assert chunks[1]['core_start_time'] == 10000
+
+
+def test_plan_chunks_no_more_chunks_than_frames():
+    chunks = plan_chunks(2, 30, 4, 1)
+
+    assert len(chunks) == 2
+    assert chunks[-1]['end_frame'] is None
+
+
+def test_merge_keeps_only_attempts_of_own_frames():
+    chunks = plan_chunks(900, 30, 2, 5)  # second chunk owns frames from 15 s, warms up from 10 s
+    first = [(4000, True, 1, None), (11000, False, 1, None)]
+    # 11100 is the attempt at 11000 seen again while warming up, the first chunk
+    # processed all of the overlap so 13000 is not an attempt a single detector finds
+    second = [(11100, False, 1, None), (13000, True, 1, None), (16000, True, 1, None)]
+
+    merged = merge_chunk_events(chunks, [first, second], 2500, 3000)
+
+    assert [event[0] for event in merged] == [4000, 11000, 16000]
+
+
+def test_merge_applies_cooldown_across_the_seam():
+    chunks = plan_chunks(900, 30, 2, 5)
+    first = [(14000, False, 1, None)]
+    # 15100 and 16000 are within the 2.5 s miss cooldown of 14000, 16600 is not
+    second = [(15100, True, 1, None), (16000, True, 1, None), (16600, False, 1, None)]
+
+    merged = merge_chunk_events(chunks, [first, second], 2500, 3000)
+
+    assert [event[0] for event in merged] == [14000, 16600]
+
+
+def test_merge_uses_made_cooldown_after_a_make():
+    chunks = plan_chunks(900, 30, 2, 5)
+    first = [(14000, True, 1, None)]
+    second = [(16600, False, 1, None), (17100, True, 1, None)]
+
+    merged = merge_chunk_events(chunks, [first, second], 2500, 3000)
+
+    assert [event[0] for event in merged] == [14000, 17100]
@@ -0,0 +1,26 @@
+import pytest
+
+from replay import parse_grid
+
+
+def test_parse_grid_combinations():
+    settings = parse_grid(['score_conf_threshold=0.6,0.7', 'score_region_above=4.5,5.5,6.5'])
+
+    assert len(settings) == 6
+    assert settings[0] == {'score_conf_threshold': 0.6, 'score_region_above': 4.5}
+    assert settings[-1] == {'score_conf_threshold': 0.7, 'score_region_above': 6.5}
+
+
+def test_parse_grid_single_value_and_no_grid():
+    assert parse_grid(['miss_cooldown_seconds=2']) == [{'miss_cooldown_seconds': 2.0}]
+    assert parse_grid([]) == [{}]
+
+
+def test_parse_grid_unknown_parameter():
+    with pytest.raises(ValueError, match='Unknown scoring parameter'):
+        parse_grid(['score_threshold=0.5'])
+
+
+def test_parse_grid_bad_value():
+    with pytest.raises(ValueError):
+        parse_grid(['score_conf_threshold=0.6,high'])
@@ -0,0 +1,59 @@
+from tracker import BallTracker
+
+
+def track(tracker, frames, speed=5):
+    """Ball moving right at speed pixels per frame, detected in frames"""
+    for frame in frames:
+        assert tracker.update((100 + speed * frame, 200), 20, 20, frame)
+
+
+def test_coasts_along_the_velocity():
+    tracker = BallTracker(max_coast=3)
+    track(tracker, range(10))
+
+    (x, y), w, h = tracker.coast(10)
+
+    assert abs(x - 150) <= 1
+    assert abs(y - 200) <= 1
+    assert (w, h) == (20, 20)
+
+
+def test_track_dropped_after_max_coast():
+    tracker = BallTracker(max_coast=3)
+    track(tracker, range(10))
+
+    assert all(tracker.coast(frame) for frame in (10, 11, 12))
+    assert tracker.coast(13) is None
+    assert not tracker.active
+    assert tracker.coast(14) is None
+
+
+def test_detection_resets_coasting():
+    tracker = BallTracker(max_coast=2)
+    track(tracker, range(10))
+
+    tracker.coast(10)
+    tracker.coast(11)
+    track(tracker, [12])
+
+    assert tracker.coasted == 0
+    assert tracker.coast(13) and tracker.coast(14)
+    assert tracker.coast(15) is None
+
+
+def test_gates_far_detections():
+    tracker = BallTracker()
+    track(tracker, range(10))
+
+    assert not tracker.update((600, 500), 20, 20, 10)
+    assert tracker.update((150, 201), 20, 20, 10)
+
+
+def test_new_track_after_long_gap():
+    tracker = BallTracker(max_coast=3)
+    track(tracker, range(10))
+
+    # Too many frames since the last estimate, a far detection starts a new track
+    assert tracker.update((600, 500), 20, 20, 20)
+    assert (tracker.x.position, tracker.y.position) == (600, 500)
+    assert tracker.x.velocity == 0
@@ -0,0 +1,76 @@
+import numpy as np
+
+from trajectory import Trajectory
+
+
+def fill(trajectory, frames):
+    for frame in frames:
+        trajectory.append((frame, 2 * frame), frame, 10, 12, 0.9)
+
+
+def test_wraparound_keeps_newest_in_order():
+    trajectory = Trajectory(4)
+    fill(trajectory, range(10))
+
+    assert len(trajectory) == 4
+    assert [entry[1] for entry in trajectory] == [6, 7, 8, 9]
+    assert trajectory[0] == ((6, 12), 6, 10, 12, 0.9)
+    assert trajectory[-1] == ((9, 18), 9, 10, 12, 0.9)
+    assert trajectory.oldest_frame() == 6
+    np.testing.assert_array_equal(trajectory.array()[:, 2], [6, 7, 8, 9])
+
+
+def test_pop_and_popleft_across_the_wrap():
+    trajectory = Trajectory(4)
+    fill(trajectory, range(6))  # rows wrapped, oldest entry is frame 2
+
+    trajectory.pop()
+    trajectory.popleft()
+
+    assert [entry[1] for entry in trajectory] == [3, 4]
+    assert trajectory[-1][1] == 4
+    assert trajectory[-2][1] == 3
+
+    fill(trajectory, [6, 7])
+    assert [entry[1] for entry in trajectory] == [3, 4, 6, 7]
+    assert trajectory[-2][1] == 6
+
+
+def test_list_round_trip():
+    trajectory = Trajectory(3)
+    fill(trajectory, range(5))
+
+    copy = Trajectory.from_list(3, trajectory.to_list())
+
+    assert copy.to_list() == trajectory.to_list()
+
+
+def test_since_across_the_wrap():
+    trajectory = Trajectory(4)
+    fill(trajectory, range(10))
+
+    np.testing.assert_array_equal(trajectory.since(8)[:, 2], [8, 9])
+    np.testing.assert_array_equal(trajectory.since(0)[:, 2], [6, 7, 8, 9])
+    assert len(trajectory.since(10)) == 0
+
+
+def test_fit_parabola_across_the_wrap():
+    trajectory = Trajectory(8)
+    for frame in range(12):
+        x = 10 * frame
+        trajectory.append((x, 0.02 * x * x - 3 * x + 400), frame, 10, 10, 0.9)
+
+    a, b, c = trajectory.fit_parabola()
+    np.testing.assert_allclose((a, b, c), (0.02, -3, 400), atol=1e-6)
+
+    # Only the newest entries
+    a, b, c = trajectory.fit_parabola(trajectory.since(9))
+    np.testing.assert_allclose((a, b, c), (0.02, -3, 400), atol=1e-6)
+
+
+def test_fit_parabola_needs_three_distinct_x():
+    trajectory = Trajectory(4)
+    for frame in range(4):
+        trajectory.append((5 + frame % 2, frame), frame, 10, 10, 0.9)
+
+    assert trajectory.fit_parabola() is None
@@ -0,0 +1,55 @@
+import numpy as np
+
+from constants import (
+    MAP_WIDTH,
+    MAP_HEIGHT,
+    BASKET_X,
+    BASKET_Y,
+    THREE_PT_RADIUS,
+)
+from zone_index import ZONE_INDEX, BORDER, NO_ZONE, court_zones, point_zone
+
+
+def test_lookup_matches_court_zones():
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(-10, MAP_WIDTH + 10, 50000)
+    ys = rng.uniform(-10, MAP_HEIGHT + 10, 50000)
+
+    np.testing.assert_array_equal(ZONE_INDEX.lookup(xs, ys), court_zones(xs, ys))
+
+
+def test_border_pixels():
+    rows, cols = np.nonzero(ZONE_INDEX.raster == BORDER)
+    assert len(rows)
+
+    # Corners, edges and centers of every border cell
+    offsets = np.array([0, 1e-9, 0.5, 1 - 1e-9])
+    xs = (cols[:, None, None] + offsets[None, :, None]).repeat(len(offsets), 2).ravel()
+    ys = (rows[:, None, None] + offsets[None, None, :]).repeat(len(offsets), 1).ravel()
+
+    expected = court_zones(xs, ys)
+    np.testing.assert_array_equal(ZONE_INDEX.lookup(xs, ys), expected)
+
+    sample = np.random.default_rng(0).choice(len(xs), 2000, replace=False)
+    for i in sample:
+        zone = ZONE_INDEX.zone(xs[i], ys[i])
+        assert zone == point_zone(xs[i], ys[i])
+        assert (zone or NO_ZONE) == expected[i]
+
+
+def test_points_on_the_arc():
+    angles = np.linspace(0, 2 * np.pi, 1000)
+    xs = BASKET_X + THREE_PT_RADIUS * np.cos(angles)
+    ys = BASKET_Y + THREE_PT_RADIUS * np.sin(angles)
+
+    expected = court_zones(xs, ys)
+    np.testing.assert_array_equal(ZONE_INDEX.lookup(xs, ys), expected)
+    assert [ZONE_INDEX.zone(x, y) or NO_ZONE for x, y in zip(xs, ys)] == expected.tolist()
+
+
+def test_points_without_a_zone():
+    assert ZONE_INDEX.zone(0, 10) is None
+    assert ZONE_INDEX.zone(None, None) is None
+    assert ZONE_INDEX.zone(-1, 10) is None
+    assert ZONE_INDEX.zone(MAP_WIDTH, 10) is None
+    assert ZONE_INDEX.lookup([np.nan, 0, MAP_WIDTH + 1], [10, 10, 10]).tolist() == [NO_ZONE] * 3
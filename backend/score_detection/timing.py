@@ -0,0 +1,46 @@
+# timing.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimings:
+    """
+    Wall time spent in each stage of the pipeline, can be used from several threads.
+    observe(stage, seconds) is also called with every measurement, e.g. to feed metrics.
+    """
+    def __init__(self, observe=None):
+        self.lock = threading.Lock()
+        self.stages = {}  # stage -> [count, total seconds, max seconds]
+        self.observe = observe
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+        if self.observe:
+            self.observe(stage, seconds)
+
+    def report(self):
+        """{stage: {count, total_s, mean_ms, max_ms}}"""
+        with self.lock:
+            return {
+                stage: {
+                    'count': count,
+                    'total_s': round(total, 4),
+                    'mean_ms': round(total / count * 1000, 3) if count else 0,
+                    'max_ms': round(longest * 1000, 3)
+                }
+                for stage, (count, total, longest) in self.stages.items()
+            }
@@ -0,0 +1,119 @@
+# tracker.py
+
+import math
+
+
+class _AxisFilter:
+    """Kalman filter of position and velocity along one image axis, per frame time steps"""
+    def __init__(self, position, position_variance, velocity_variance):
+        self.position = position
+        self.velocity = 0.0
+        # Covariance [[p_pp, p_pv], [p_pv, p_vv]]
+        self.p_pp = position_variance
+        self.p_pv = 0.0
+        self.p_vv = velocity_variance
+
+    def predict(self, steps, accel_variance):
+        """Advance by steps frames, accel_variance is the random acceleration per frame"""
+        dt = steps
+        self.position += self.velocity * dt
+        self.p_pp += 2 * dt * self.p_pv + dt * dt * self.p_vv + accel_variance * dt ** 4 / 4
+        self.p_pv += dt * self.p_vv + accel_variance * dt ** 3 / 2
+        self.p_vv += accel_variance * dt * dt
+
+    def innovation(self, measured, noise_variance):
+        """(measured - predicted position, its variance)"""
+        return measured - self.position, self.p_pp + noise_variance
+
+    def update(self, measured, noise_variance):
+        residual, variance = self.innovation(measured, noise_variance)
+        gain_p = self.p_pp / variance
+        gain_v = self.p_pv / variance
+
+        self.position += gain_p * residual
+        self.velocity += gain_v * residual
+        self.p_vv -= gain_v * self.p_pv
+        self.p_pv -= gain_v * self.p_pp
+        self.p_pp -= gain_p * self.p_pp
+
+
+class BallTracker:
+    """
+    Constant velocity Kalman filter of the ball center.
+
+    Detections are gated against the predicted position, a detection too far from it
+    for the current uncertainty is rejected as another ball or a false positive. Frames
+    without an accepted detection get the predicted position, for at most max_coast
+    frames in a row, after which the track is dropped and the next detection starts a
+    new one. Noise is relative to the ball size, so the same settings fit any resolution.
+    """
+    def __init__(self, max_coast=3, gate=9.21, measurement_noise=0.25, acceleration_noise=0.5, max_speed=2):
+        self.max_coast = max_coast
+        self.gate = gate  # max squared normalized distance, 9.21 keeps 99% of true detections
+        self.measurement_noise = measurement_noise    # detection error, in ball diameters
+        self.acceleration_noise = acceleration_noise  # change of velocity per frame, in ball diameters
+        self.max_speed = max_speed                    # typical speed of a new track per frame, in ball diameters
+        self.reset()
+
+    def reset(self):
+        self.x = self.y = None
+        self.frame = None   # frame of the current estimate
+        self.size = None    # (w, h) of the last accepted detection
+        self.coasted = 0    # frames since the last accepted detection
+
+    @property
+    def active(self):
+        return self.x is not None
+
+    @staticmethod
+    def _diameter(w, h):
+        return max(1.0, math.hypot(w, h) / math.sqrt(2))
+
+    def _noise(self):
+        diameter = self._diameter(*self.size)
+        return (self.measurement_noise * diameter) ** 2, (self.acceleration_noise * diameter) ** 2
+
+    def _predict(self, frame):
+        steps = frame - self.frame
+        if steps > 0:
+            _, accel_variance = self._noise()
+            self.x.predict(steps, accel_variance)
+            self.y.predict(steps, accel_variance)
+            self.frame = frame
+
+    def update(self, center, w, h, frame):
+        """Offer a ball detection of frame, returns whether it is consistent with the track"""
+        if not self.active or frame - self.frame > self.max_coast + 1:
+            # New track, the velocity is unknown
+            diameter = self._diameter(w, h)
+            position_variance = (self.measurement_noise * diameter) ** 2
+            velocity_variance = (self.max_speed * diameter) ** 2
+            self.x = _AxisFilter(center[0], position_variance, velocity_variance)
+            self.y = _AxisFilter(center[1], position_variance, velocity_variance)
+            self.frame, self.size, self.coasted = frame, (w, h), 0
+            return True
+
+        self._predict(frame)
+        noise_variance, _ = self._noise()
+        residual_x, variance_x = self.x.innovation(center[0], noise_variance)
+        residual_y, variance_y = self.y.innovation(center[1], noise_variance)
+        if residual_x ** 2 / variance_x + residual_y ** 2 / variance_y > self.gate:
+            return False
+
+        self.x.update(center[0], noise_variance)
+        self.y.update(center[1], noise_variance)
+        self.size, self.coasted = (w, h), 0
+        return True
+
+    def coast(self, frame):
+        """Predicted ((x, y), w, h) for a frame without an accepted detection, or None"""
+        if not self.active:
+            return None
+
+        self.coasted += 1
+        if self.coasted > self.max_coast:
+            self.reset()
+            return None
+
+        self._predict(frame)
+        return (int(self.x.position), int(self.y.position)), self.size[0], self.size[1]
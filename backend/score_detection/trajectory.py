@@ -0,0 +1,109 @@
+# trajectory.py
+
+import numpy as np
+
+# Columns of a trajectory row
+X, Y, FRAME, W, H, CONF = range(6)
+
+
+class Trajectory:
+    """
+    Fixed capacity ring buffer of detections, backed by a single NumPy array.
+
+    Indexing returns entries in the same form as before, ((x, y), frame, w, h, conf), so
+    code reading single entries does not change. Whole trajectory analyses use array()
+    instead of looping over entries. Appending to a full trajectory drops the oldest entry.
+    """
+    def __init__(self, capacity):
+        self.data = np.zeros((capacity, 6), dtype=np.float64)
+        self.capacity = capacity
+        self.start = 0  # row of the oldest entry
+        self.size = 0
+        self.recent = [None, None]  # the two newest entries as tuples, read on every frame
+
+    @classmethod
+    def from_list(cls, capacity, entries):
+        """Trajectory from ((x, y), frame, w, h, conf) entries, e.g. loaded from a checkpoint"""
+        trajectory = cls(capacity)
+        for center, frame, w, h, conf in entries:
+            trajectory.append(tuple(center), frame, w, h, conf)
+        return trajectory
+
+    def to_list(self):
+        return [self[i] for i in range(self.size)]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def _row(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("trajectory index out of range")
+        return (self.start + index) % self.capacity
+
+    def __getitem__(self, index):
+        if -3 < index < 0 and index >= -self.size:
+            entry = self.recent[index]
+            if entry is None:
+                entry = self.recent[index] = self._entry(index)
+            return entry
+        return self._entry(index)
+
+    def oldest_frame(self):
+        return int(self.data[self.start, FRAME])
+
+    def _entry(self, index):
+        x, y, frame, w, h, conf = self.data[self._row(index)].tolist()
+        return (int(x), int(y)), int(frame), int(w), int(h), conf
+
+    def append(self, center, frame, w, h, conf):
+        if self.size == self.capacity:
+            self.popleft()
+        self.data[(self.start + self.size) % self.capacity] = (center[0], center[1], frame, w, h, conf)
+        self.size += 1
+        self.recent = [self.recent[1], ((int(center[0]), int(center[1])), int(frame), int(w), int(h), float(conf))]
+
+    def pop(self):
+        """Remove the newest entry"""
+        if not self.size:
+            raise IndexError("pop from empty trajectory")
+        self.size -= 1
+        self.recent = [None, self.recent[0]]
+
+    def popleft(self):
+        """Remove the oldest entry"""
+        if not self.size:
+            raise IndexError("pop from empty trajectory")
+        self.start = (self.start + 1) % self.capacity
+        self.size -= 1
+
+    def clear(self):
+        self.start = self.size = 0
+        self.recent = [None, None]
+
+    def array(self):
+        """Entries as an (n, 6) array in order from oldest to newest, columns X, Y, FRAME, W, H, CONF"""
+        end = self.start + self.size
+        if end <= self.capacity:
+            return self.data[self.start:end]
+        return np.concatenate((self.data[self.start:], self.data[:end - self.capacity]))
+
+    def since(self, frame):
+        """Rows of the entries detected at or after frame"""
+        rows = self.array()
+        return rows[rows[:, FRAME] >= frame]
+
+    def fit_parabola(self, rows=None):
+        """
+        Least squares fit of y = a * x^2 + b * x + c through the centers of rows (the whole
+        trajectory by default), returns (a, b, c) or None with fewer than 3 distinct x.
+        """
+        rows = self.array() if rows is None else rows
+        if len(np.unique(rows[:, X])) < 3:
+            return None
+        return tuple(np.polyfit(rows[:, X], rows[:, Y], 2))
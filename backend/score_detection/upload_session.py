@@ -0,0 +1,187 @@
+# upload_session.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+UPLOADING = 'uploading'
+COMPLETE = 'complete'
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status  # HTTP status to answer with
+
+
+class UploadStore:
+    """
+    Resumable uploads written straight to their final path in the upload folder.
+
+    Every upload has a session file with the expected size and sha256, the number of
+    bytes received and the runs waiting for it, so a client can continue from the last
+    received offset after a dropped connection or a server restart. Chunks are streamed
+    to disk as they arrive and the sha256 is verified when the upload is finalized.
+    """
+    def __init__(self, upload_path, session_path, read_size=1 << 20):
+        self.upload_path = upload_path
+        self.session_path = session_path
+        self.read_size = read_size
+        self.lock = threading.Lock()
+        self.upload_locks = {}  # upload_id -> lock serializing writes of that upload
+        os.makedirs(self.upload_path, exist_ok=True)
+        os.makedirs(self.session_path, exist_ok=True)
+
+    def _session_file(self, upload_id):
+        return os.path.join(self.session_path, f"{os.path.basename(upload_id)}.json")
+
+    def _save(self, session):
+        file_path = self._session_file(session['upload_id'])
+        with open(file_path + '.tmp', 'w') as f:
+            json.dump(session, f)
+        os.replace(file_path + '.tmp', file_path)
+
+    def _upload_lock(self, upload_id):
+        with self.lock:
+            return self.upload_locks.setdefault(upload_id, threading.Lock())
+
+    def get(self, upload_id):
+        file_path = self._session_file(upload_id)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    def _get_or_raise(self, upload_id):
+        session = self.get(upload_id)
+        if session is None:
+            raise UploadError(f"No upload found for upload_id {upload_id}", 404)
+        return session
+
+    def create(self, filename, size, sha256):
+        """Start an upload of size bytes to the upload folder, sha256 is checked on finalize"""
+        if not filename or not isinstance(filename, str):
+            raise UploadError("filename is required")
+        # bool is an int as well
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise UploadError("size must be a non-negative integer")
+        if sha256 is not None and not isinstance(sha256, str):
+            raise UploadError("sha256 must be a hex string")
+
+        # Sanitize filename to prevent directory traversal, the upload_id prefix keeps
+        # uploads of the same file name (and files of earlier uploads) apart
+        upload_id = str(uuid.uuid4())
+        path = os.path.join(self.upload_path, f"{upload_id}_{os.path.basename(filename)}")
+
+        session = {
+            'upload_id': upload_id,
+            'filename': os.path.basename(filename),
+            'path': path,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'received': 0,
+            'state': UPLOADING,
+            'run_ids': [],
+            'created_at': time.time()
+        }
+
+        open(path, 'wb').close()
+        self._save(session)
+        logger.log(INFO, f"Upload {session['upload_id']} started: {path}, {size} bytes")
+        return session
+
+    def write_chunk(self, upload_id, offset, stream):
+        """
+        Write the body stream at offset. A chunk may start anywhere up to the bytes
+        received so far, so a chunk that was cut off can simply be sent again.
+        """
+        with self._upload_lock(upload_id):
+            session = self._get_or_raise(upload_id)
+
+            if session['state'] != UPLOADING:
+                raise UploadError(f"Upload {upload_id} is already {session['state']}", 409)
+            if offset < 0 or offset > session['received']:
+                raise UploadError(f"Offset {offset} does not continue the {session['received']} bytes received", 409)
+
+            end = offset
+            try:
+                with open(session['path'], 'r+b') as f:
+                    f.seek(offset)
+                    while True:
+                        data = stream.read(self.read_size)
+                        if not data:
+                            break
+                        if end + len(data) > session['size']:
+                            raise UploadError(f"Upload {upload_id} exceeds its size of {session['size']} bytes")
+                        f.write(data)
+                        end += len(data)
+            finally:
+                # Keep what was written before a dropped connection, the client resumes from there
+                session['received'] = max(session['received'], end)
+                self._save(session)
+            return session
+
+    def finalize(self, upload_id):
+        """Verify size and sha256 of a fully received upload, returns the session and the file digest"""
+        with self._upload_lock(upload_id):
+            session = self._get_or_raise(upload_id)
+
+            if session['state'] == COMPLETE:
+                return session, None
+            if session['received'] != session['size']:
+                raise UploadError(f"Upload {upload_id} has {session['received']} of {session['size']} bytes", 409)
+
+            digest = hashlib.sha256()
+            with open(session['path'], 'rb') as f:
+                for data in iter(lambda: f.read(self.read_size), b''):
+                    digest.update(data)
+            digest = digest.hexdigest()
+
+            if session['sha256'] and digest != session['sha256']:
+                # Start over, the corrupted bytes can't be located
+                session['received'] = 0
+                self._save(session)
+                raise UploadError(f"sha256 of upload {upload_id} does not match, upload it again", 422)
+
+            session['state'] = COMPLETE
+            self._save(session)
+            logger.log(INFO, f"Upload {upload_id} complete: {session['path']}")
+            return session, digest
+
+    def is_complete(self, upload_id):
+        """True once the upload is finalized, unknown uploads count as complete"""
+        session = self.get(upload_id)
+        return session is None or session['state'] == COMPLETE
+
+    def attach_run(self, upload_id, run_id):
+        """Record that run_id waits for this upload, returns the session"""
+        with self._upload_lock(upload_id):
+            session = self._get_or_raise(upload_id)
+            if run_id not in session['run_ids']:
+                session['run_ids'].append(run_id)
+                self._save(session)
+            return session
+
+    def waiting_runs(self):
+        """run_id -> upload_ids of unfinished uploads the run waits for"""
+        waiting = {}
+        for name in sorted(os.listdir(self.session_path)):
+            if not name.endswith('.json'):
+                continue
+            session = self.get(name[:-len('.json')])
+            if session and session['state'] == UPLOADING:
+                for run_id in session['run_ids']:
+                    waiting.setdefault(run_id, []).append(session['upload_id'])
+        return waiting
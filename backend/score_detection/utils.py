@@ -2,40 +2,36 @@ import math
 import numpy as np
 from datetime import timedelta, datetime
 
-def in_score_region(ball_pos, hoop_pos):
+# Region around a hoop entry ((x, y), frame, w, h, conf) where the ball counts as being at the rim,
+# width rim widths to each side, above / below rim heights above and below the rim center
+# Returns (x1, y1, x2, y2)
+def score_region(hoop, width=2, above=5.5, below=0.9):
+    x1 = hoop[0][0] - width * hoop[2]
+    x2 = hoop[0][0] + width * hoop[2]
+    y1 = hoop[0][1] - above * hoop[3]
+    y2 = hoop[0][1] + below * hoop[3]
+
+    return x1, y1, x2, y2
+
+# ball_pos and hoop_pos are Trajectory buffers of ((x, y), frame, w, h, conf) entries
+def in_score_region(ball_pos, hoop_pos, width=2, above=5.5, below=0.9):
     if len(hoop_pos) < 1 or len(ball_pos) < 1:
         return False
     
-    x = ball_pos[-1][0][0]
-    y = ball_pos[-1][0][1]
+    x, y = ball_pos[-1][0]
 
-    x1 = hoop_pos[-1][0][0] - 2 * hoop_pos[-1][2]
-    x2 = hoop_pos[-1][0][0] + 2 * hoop_pos[-1][2]
-    y1 = hoop_pos[-1][0][1] - 5.5 * hoop_pos[-1][3]
-    y2 = hoop_pos[-1][0][1] + 0.9 * hoop_pos[-1][3]
+    x1, y1, x2, y2 = score_region(hoop_pos[-1], width, above, below)
 
     return (x1 < x < x2 and y1 < y < y2)
 
 # Removes inaccurate data points
 # TODO: improve noise filtering
-def clean_ball_pos(ball_pos, frame_count):
+def clean_ball_pos(ball_pos, frame_count, reject_jumps=True):
     # Removes inaccurate ball size to prevent jumping to wrong ball
-    if len(ball_pos) > 1:
-        # Width and Height
-        w1 = ball_pos[-2][2]
-        h1 = ball_pos[-2][3]
-        w2 = ball_pos[-1][2]
-        h2 = ball_pos[-1][3]
-
-        # X and Y coordinates
-        x1 = ball_pos[-2][0][0]
-        y1 = ball_pos[-2][0][1]
-        x2 = ball_pos[-1][0][0]
-        y2 = ball_pos[-1][0][1]
-
-        # Frame count
-        f1 = ball_pos[-2][1]
-        f2 = ball_pos[-1][1]
+    if reject_jumps and len(ball_pos) > 1:
+        # Center, frame count, width and height
+        (x1, y1), f1, w1, h1, _ = ball_pos[-2]
+        (x2, y2), f2, w2, h2, _ = ball_pos[-1]
         f_dif = f2 - f1
 
         dist = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
@@ -54,26 +50,16 @@ def clean_ball_pos(ball_pos, frame_count):
 
     # Remove points older than 30 frames
     if len(ball_pos) > 0:
-        if frame_count - ball_pos[0][1] > 90:
-            ball_pos.pop(0)
+        if frame_count - ball_pos.oldest_frame() > 90:
+            ball_pos.popleft()
 
     return ball_pos
 
 def clean_hoop_pos(hoop_pos):
     # Prevents jumping from one hoop to another
     if len(hoop_pos) > 1:
-        x1 = hoop_pos[-2][0][0]
-        y1 = hoop_pos[-2][0][1]
-        x2 = hoop_pos[-1][0][0]
-        y2 = hoop_pos[-1][0][1]
-
-        w1 = hoop_pos[-2][2]
-        h1 = hoop_pos[-2][3]
-        w2 = hoop_pos[-1][2]
-        h2 = hoop_pos[-1][3]
-
-        f1 = hoop_pos[-2][1]
-        f2 = hoop_pos[-1][1]
+        (x1, y1), f1, w1, h1, _ = hoop_pos[-2]
+        (x2, y2), f2, w2, h2, _ = hoop_pos[-1]
 
         f_dif = f2-f1
 
@@ -91,7 +77,7 @@ def clean_hoop_pos(hoop_pos):
 
     # Remove old points
     if len(hoop_pos) > 40:
-        hoop_pos.pop(0)
+        hoop_pos.popleft()
 
     return hoop_pos
 
@@ -99,17 +85,15 @@ def detect_score(ball_pos, hoop_pos, last_pos):
     if len(ball_pos) < 2:
         return False
     
-    hoop_l = hoop_pos[-1][0][0] - 0.5 * hoop_pos[-1][2]
-    hoop_r = hoop_pos[-1][0][0] + 0.5 * hoop_pos[-1][2]
-    hoop_t = hoop_pos[-1][0][1] - 0.5 * hoop_pos[-1][3]
-    hoop_b = hoop_pos[-1][0][1] + 0.5 * hoop_pos[-1][3]
+    (hoop_x, hoop_y_mid), _, hoop_w, hoop_h, _ = hoop_pos[-1]
 
-    
-    pos2 = ball_pos[-1][0]
-    pos1 = last_pos[0]
+    hoop_l = hoop_x - 0.5 * hoop_w
+    hoop_r = hoop_x + 0.5 * hoop_w
+    hoop_t = hoop_y_mid - 0.5 * hoop_h
+    hoop_b = hoop_y_mid + 0.5 * hoop_h
 
-    x1, y1 = pos1[0], pos1[1]
-    x2, y2 = pos2[0], pos2[1]
+    x1, y1 = last_pos[0]
+    x2, y2 = ball_pos[-1][0]
 
     if hoop_l < x2 < hoop_r and hoop_t < y2 < hoop_b:
         return True
@@ -121,9 +105,7 @@ def detect_score(ball_pos, hoop_pos, last_pos):
     if y1 > y2:
         return False
 
-    hoop_l, hoop_r = hoop_pos[-1][0][0] - 0.3 * hoop_pos[-1][2], hoop_pos[-1][0][0] + 0.3 * hoop_pos[-1][2]
-    hoop_y_mid = hoop_pos[-1][0][1]
-    hoop_h = hoop_pos[-1][3]
+    hoop_l, hoop_r = hoop_x - 0.3 * hoop_w, hoop_x + 0.3 * hoop_w
 
     hoop_y1, hoop_y2 = hoop_y_mid - 0.3*hoop_h, hoop_y_mid + 0.3*hoop_h
 
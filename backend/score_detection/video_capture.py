@@ -0,0 +1,230 @@
+# video_capture.py
+
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from logger import (
+    INFO,
+    Logger
+)
+
+logger = Logger([
+    INFO
+])
+
+
+def mp4_index_first(path):
+    """
+    True if the index (moov, or moof for fragmented files) of an MP4 comes before its
+    media data, False if it comes after, None if not enough of the file is written yet.
+    Files that are not MP4 return True and are left to OpenCV.
+    """
+    with open(path, 'rb') as f:
+        first = True
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            size, box = struct.unpack('>I4s', header)
+
+            if first and box != b'ftyp':
+                return True
+            first = False
+
+            if box in (b'moov', b'moof'):
+                return True
+            if box == b'mdat':
+                return False
+
+            if size == 1:
+                large_size = f.read(8)
+                if len(large_size) < 8:
+                    return None
+                f.seek(struct.unpack('>Q', large_size)[0] - 16, os.SEEK_CUR)
+            elif size == 0:
+                # Box runs to the end of the file
+                return None
+            else:
+                f.seek(size - 8, os.SEEK_CUR)
+
+
+class TailFollowCapture:
+    """
+    cv2.VideoCapture over a video that is still being uploaded.
+
+    Reading past the bytes written so far fails like the end of the video, so instead of
+    stopping, the capture waits for the file to grow, reopens it and seeks to the next
+    frame. It only ends once is_complete() returns True and no frame is left.
+
+    An MP4 can only be read early if its index is at the start (written with
+    -movflags +faststart, or fragmented), otherwise the capture waits for the upload to
+    complete before opening it. TimeoutError is raised when the file stops growing for
+    stall_timeout seconds before the upload completes.
+    """
+    def __init__(self, path, is_complete, poll_interval=1.0, stall_timeout=600):
+        self.path = path
+        self.is_complete = is_complete
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.next_frame = 0   # index of the frame the next read returns
+        self.finished = False
+        self.cap = None
+        self._open()
+
+    def _wait(self):
+        """Sleep until the file grows or the upload completes"""
+        size = os.path.getsize(self.path)
+        stalled = 0
+        while not self.is_complete():
+            time.sleep(self.poll_interval)
+            if os.path.getsize(self.path) != size:
+                return
+            stalled += self.poll_interval
+            if stalled >= self.stall_timeout:
+                raise TimeoutError(f"{self.path} did not grow for {self.stall_timeout}s")
+
+    def _open(self):
+        """Open the capture at next_frame, waiting until enough of the file is there"""
+        while True:
+            complete = self.is_complete()
+            if complete or mp4_index_first(self.path):
+                cap = cv2.VideoCapture(self.path)
+                if complete or (cap.isOpened() and cap.get(cv2.CAP_PROP_FPS) > 0):
+                    if self.next_frame > 0:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, self.next_frame)
+                    self.cap = cap
+                    return
+                cap.release()
+            self._wait()
+
+    def read(self):
+        while True:
+            ret, frame = self.cap.read()
+            if ret:
+                self.next_frame += 1
+                return ret, frame
+
+            if self.finished:
+                return False, None
+
+            if self.is_complete():
+                # The last bytes may have arrived after this capture was opened
+                self.finished = True
+            else:
+                logger.log(INFO, f"Waiting for more of {self.path} at frame {self.next_frame}")
+                self._wait()
+
+            self.cap.release()
+            self._open()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.next_frame = int(value)
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class LiveCapture:
+    """
+    cv2.VideoCapture over a live source (an RTSP/HTTP/UDP URL, or a named pipe fed by
+    e.g. ffmpeg) that never falls behind it.
+
+    A reader thread keeps reading the source and holds only the latest buffer_size
+    frames, older frames are dropped when processing can't keep up. frame_index counts
+    every frame of the source including dropped ones, so frame based durations still
+    match the stream. read() returns (False, None) once the stream has ended and every
+    buffered frame was read.
+    """
+    def __init__(self, source, buffer_size=2):
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open live source {source}")
+
+        # Read before the reader thread starts, the capture is only used by that thread afterwards
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.width = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        self.height = self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+
+        self.buffer = deque(maxlen=max(1, buffer_size))
+        self.condition = threading.Condition()
+        self.ended = False
+        self.stopped = threading.Event()
+
+        self.frames_read = 0
+        self.dropped_frames = 0
+        self.frame_index = -1   # source index of the frame last returned by read()
+        self.timestamp = 0      # ms, of the frame last returned by read()
+
+        self.reader = threading.Thread(target=self._reader)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def _reader(self):
+        try:
+            while not self.stopped.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+
+                # Stream time if the source has one, otherwise derived from the frame index
+                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+                if timestamp <= 0 and self.frames_read > 0:
+                    timestamp = self.frames_read * 1000 / self.fps
+
+                with self.condition:
+                    if len(self.buffer) == self.buffer.maxlen:
+                        self.dropped_frames += 1
+                    self.buffer.append((self.frames_read, timestamp, frame))
+                    self.frames_read += 1
+                    self.condition.notify()
+        finally:
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+            logger.log(INFO, f"Live source {self.source} ended after {self.frames_read} frames, {self.dropped_frames} dropped")
+
+    def read(self):
+        with self.condition:
+            while not self.buffer and not self.ended:
+                self.condition.wait()
+            if not self.buffer:
+                return False, None
+            self.frame_index, self.timestamp, frame = self.buffer.popleft()
+            return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.timestamp
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def set(self, prop, value):
+        # Live sources can't seek
+        return False
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.stopped.set()
+        self.reader.join(timeout=5.0)
+        self.cap.release()
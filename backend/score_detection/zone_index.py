@@ -0,0 +1,124 @@
+# zone_index.py
+
+import numpy as np
+
+from constants import (
+    MAP_WIDTH,
+    MAP_HEIGHT,
+    BASKET_X,
+    BASKET_Y,
+    PENALTY_BOX_X1,
+    PENALTY_BOX_X2,
+    PENALTY_BOX_Y2,
+    THREE_PT_LEFT,
+    THREE_PT_RIGHT,
+    THREE_PT_RADIUS,
+    WING_ZONE_Y,
+)
+
+# Zone id of points outside the court or without a zone, real zones are 1 to NUM_ZONES
+NO_ZONE = 0
+# Raster cells crossed by a zone border, looked up with the exact rules instead
+BORDER = -1
+
+
+def court_zones(x, y):
+    """
+    Zones of the court points (x, y), arrays of any matching shape, the only copy of the
+    zone rules. NaN coordinates and points without a zone get NO_ZONE.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    zones = np.full(np.broadcast(x, y).shape, NO_ZONE, dtype=np.int8)
+
+    with np.errstate(invalid='ignore'):
+        on_court = (x != 0) & (y != 0) & (0 < x) & (x < MAP_WIDTH) & (0 < y) & (y < MAP_HEIGHT)
+        distance = np.sqrt((x - BASKET_X) ** 2 + (y - BASKET_Y) ** 2)
+
+        is_three_pt = (x < THREE_PT_LEFT) | (x > THREE_PT_RIGHT) | (distance > THREE_PT_RADIUS)
+        column = np.where(x < PENALTY_BOX_X1, 1, np.where(x < PENALTY_BOX_X2, 2, 3))
+
+        two_pt = np.where(y > PENALTY_BOX_Y2, 4, column)
+        corner = np.where(x < THREE_PT_LEFT, 8, np.where(x > THREE_PT_RIGHT, 9, NO_ZONE))
+        three_pt = np.where(y < WING_ZONE_Y, corner, column + 4)
+
+    zones[on_court] = np.where(is_three_pt, three_pt, two_pt)[on_court]
+    return zones
+
+
+def point_zone(x, y):
+    """Zone of one court point, or None"""
+    zone = int(court_zones(x, y))
+    return zone if zone != NO_ZONE else None
+
+
+class ZoneIndex:
+    """
+    Zone ids of the court map precomputed on a MAP_WIDTH x MAP_HEIGHT raster of 1x1 cells.
+
+    Cells entirely inside one zone answer a lookup directly. The few cells a zone border
+    passes through are marked BORDER and fall back to court_zones(), so lookup() and zone()
+    give the zones of court_zones() at any sub-cell position.
+    """
+    def __init__(self):
+        cols = np.arange(MAP_WIDTH, dtype=float)
+        rows = np.arange(MAP_HEIGHT, dtype=float)
+
+        # Zone at the cell centers
+        xs, ys = np.meshgrid(cols + 0.5, rows + 0.5)
+        raster = court_zones(xs, ys)
+
+        # Cells whose closed box [x, x + 1] x [y, y + 1] touches a straight border
+        border_x = np.zeros(MAP_WIDTH, dtype=bool)
+        for edge in (0, MAP_WIDTH, PENALTY_BOX_X1, PENALTY_BOX_X2, THREE_PT_LEFT, THREE_PT_RIGHT):
+            border_x |= (cols <= edge) & (edge <= cols + 1)
+        border_y = np.zeros(MAP_HEIGHT, dtype=bool)
+        for edge in (0, MAP_HEIGHT, PENALTY_BOX_Y2, WING_ZONE_Y):
+            border_y |= (rows <= edge) & (edge <= rows + 1)
+        border = border_x[np.newaxis, :] | border_y[:, np.newaxis]
+
+        # Cells the three point arc passes through, nearest and farthest corner from the basket
+        near_x = np.clip(BASKET_X, cols, cols + 1) - BASKET_X
+        near_y = np.clip(BASKET_Y, rows, rows + 1) - BASKET_Y
+        far_x = np.maximum(np.abs(cols - BASKET_X), np.abs(cols + 1 - BASKET_X))
+        far_y = np.maximum(np.abs(rows - BASKET_Y), np.abs(rows + 1 - BASKET_Y))
+        nearest = np.hypot(near_x[np.newaxis, :], near_y[:, np.newaxis])
+        farthest = np.hypot(far_x[np.newaxis, :], far_y[:, np.newaxis])
+        border |= (nearest <= THREE_PT_RADIUS) & (THREE_PT_RADIUS <= farthest)
+
+        raster[border] = BORDER
+        self.raster = raster  # [row, column], row y and column x in map coordinates
+        self.rows = raster.tolist()  # the same as lists, indexing a list is faster for single points
+
+    def lookup(self, x, y):
+        """Zones of the court points (x, y), arrays of any matching shape, NO_ZONE for none"""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        x, y = np.broadcast_arrays(x, y)
+        zones = np.full(x.shape, NO_ZONE, dtype=np.int8)
+
+        # NaN and off map points fail both comparisons
+        with np.errstate(invalid='ignore'):
+            inside = (0 <= x) & (x < MAP_WIDTH) & (0 <= y) & (y < MAP_HEIGHT)
+        zones[inside] = self.raster[y[inside].astype(np.intp), x[inside].astype(np.intp)]
+
+        border = zones == BORDER
+        if border.any():
+            zones[border] = court_zones(x[border], y[border])
+        return zones
+
+    def zone(self, x, y):
+        """Zone of one court point, or None"""
+        if not x or not y:
+            return None
+        if not (0 <= x < MAP_WIDTH and 0 <= y < MAP_HEIGHT):
+            return None
+
+        zone = self.rows[int(y)][int(x)]
+        if zone == BORDER:
+            return point_zone(x, y)
+        return zone if zone != NO_ZONE else None
+
+
+# Built once on import, the raster is about 80 kB
+ZONE_INDEX = ZoneIndex()